@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# Compares rendering symbols one at a time with cdecl_sym against
+# rendering them in a batch with cdecl_many, which caches rendered
+# qualified names and types across symbols.
+
+import argparse
+from cppmangle import demangle, demangle_many, cdecl_sym, cdecl_many, Interner
+from run import load_corpus
+from common import throughput
+
+def _batch_throughput(syms, repeat=3):
+    return throughput(lambda batch: list(cdecl_many(batch)), [syms], repeat) * len(syms)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--min-symbols', type=int, default=20000)
+    args = ap.parse_args()
+
+    names = load_corpus()
+    names = names * (args.min_symbols // len(names) + 1)
+
+    sets = [
+        ('demangled', [demangle(name) for name in names]),
+        ('interned', list(demangle_many(names, interner=Interner()))),
+        ]
+    for label, syms in sets:
+        single = throughput(cdecl_sym, syms)
+        many = _batch_throughput(syms)
+
+        print('{}:'.format(label))
+        print('  cdecl_sym:  {:10.0f} symbols/s'.format(single))
+        print('  cdecl_many: {:10.0f} symbols/s ({:.2f}x)'.format(many, many / single))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+# Helpers shared by the benchmark scripts.
+
+import time
+
+_templates = [
+    '?method{0}@Class{1}@ns@@QAEXHPAVFoo{2}@@@Z',
+    '?get{0}@?$vector@HV?$allocator@H@std@@@std@@QBEABHI@Z',
+    '??0Widget{0}@ui@@QAE@PAVWidget{1}@1@ABV?$basic_string@DU?$char_traits@D@std@@V?$allocator@D@2@@std@@@Z',
+    '?callback{0}@@YAXP6AHPAX@Z0@Z',
+    '?table{0}@@3PAY0BA@HA',
+    '?s_instance{0}@Singleton{1}@@0PAV1@A',
+    ]
+
+def synthetic_names(count):
+    for i in range(count):
+        template = _templates[i % len(_templates)]
+        yield template.format(i, i // 7, i // 13)
+
+def throughput(fn, items, repeat=3):
+    # Returns the best items/sec rate of `fn` applied to every item.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(items) / best
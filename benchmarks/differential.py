@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# Differential check of the two demangling engines: the single-pass
+# demangler (msvc_demangle, the default) must give the same AST as the
+# speg grammar (msvc_demangle_peg) for the corpus and for generated names.
+#
+# Every prefix and random corruptions of the corpus names are checked as
+# well. The speg grammar accepts some malformed names, e.g. with a missing
+# '@' terminator, which the single-pass demangler rejects; for these the
+# single-pass demangler may fail where the grammar parses, but whenever it
+# parses a name, the grammar must give the same AST. Both must only ever
+# raise DemangleError.
+#
+# Last, incremental demangling, which resumes each name from the state the
+# previous one reached, must give the same results as demangling every
+# name on its own, over all of the above sorted together with copies of
+# the corpus names carrying a suffix.
+
+import argparse
+import random
+import sys
+import time
+from cppmangle.msvc import msvc_demangle, msvc_demangle_peg, msvc_demangle_many, DemangleError, DemangleFailure
+from cppmangle.generate import generate_names
+from run import load_corpus
+
+_alphabet = '?@$0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcxyz'
+
+def _result(fn, name):
+    # the AST, or None if the name is rejected; any other exception
+    # escapes and counts as a mismatch
+    try:
+        return fn(name)
+    except DemangleError:
+        return None
+
+def corruptions(names, count, seed):
+    rand = random.Random(seed)
+    for name in names:
+        for i in range(1, len(name)):
+            yield name[:i]
+    for _ in range(count):
+        name = list(rand.choice(names))
+        i = rand.randrange(len(name))
+        op = rand.randrange(3)
+        if op == 0:
+            name[i] = rand.choice(_alphabet)
+        elif op == 1:
+            name.insert(i, rand.choice(_alphabet))
+        else:
+            del name[i]
+        yield ''.join(name)
+
+def check(names, valid):
+    mismatches = 0
+    for name in names:
+        try:
+            fast = _result(msvc_demangle, name)
+            peg = _result(msvc_demangle_peg, name)
+        except Exception as e:
+            print('{}: {}: {}'.format(name, type(e).__name__, e))
+            mismatches += 1
+            continue
+        if (fast != peg and (valid or fast is not None)) or (valid and fast is None):
+            print('{}: engines disagree ({} vs {})'.format(
+                name, 'fails' if fast is None else 'parses', 'fails' if peg is None else 'parses'))
+            mismatches += 1
+    return mismatches
+
+def _settled(sym):
+    # the symbol with a lazy type parsed, or None if either fails
+    if isinstance(sym, DemangleFailure):
+        return None
+    try:
+        getattr(sym, 'type', None)
+    except DemangleError:
+        return None
+    return sym
+
+def check_incremental(names):
+    mismatches = 0
+    for lazy in (False, True):
+        expected = msvc_demangle_many(names, lazy=lazy)
+        got = msvc_demangle_many(names, incremental=True, lazy=lazy)
+        for name, a, b in zip(names, expected, got):
+            a, b = _settled(a), _settled(b)
+            if a != b:
+                print('{}: incremental {}, plain {}{}'.format(name,
+                    'fails' if b is None else 'parses', 'fails' if a is None else 'parses',
+                    ' (lazy)' if lazy else ''))
+                mismatches += 1
+    return mismatches
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=10000, help='generated names')
+    ap.add_argument('--corruptions', type=int, default=10000, help='randomly corrupted corpus names')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    corpus = load_corpus()
+    start = time.perf_counter()
+    mismatches = check(corpus + list(generate_names(args.count, args.seed)), True)
+    bad_input = list(corruptions(corpus, args.corruptions, args.seed))
+    mismatches += check(bad_input, False)
+    suffixed = [name + suffix for name in corpus for suffix in ('Z', '@', 'junk')]
+    mismatches += check_incremental(sorted(set(corpus + bad_input + suffixed)))
+    elapsed = time.perf_counter() - start
+
+    print('{} valid and {} corrupted names, {} mismatches, {:.1f} s'.format(
+        len(corpus) + args.count, len(bad_input), mismatches, elapsed))
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# Round-trip fuzzing: generates random symbols, mangles them and checks
+# that demangling gives back the same AST and mangling that AST gives
+# back the same name.
+#
+# The mangler and demangler can agree with each other and still both be
+# wrong, so real MSVC names listed in known.txt with their declarations
+# are checked first, against both engines and both manglers.
+
+import argparse
+import os
+import sys
+import time
+from cppmangle import mangle, demangle, cdecl_sym
+from cppmangle.msvc import msvc_demangle_peg, msvc_mangle_format
+from cppmangle.generate import SymbolGenerator
+
+_known_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'known.txt')
+
+def check_known(path=_known_path):
+    # returns the number of names whose declaration or encoding differs
+    failures = 0
+    with open(path) as f:
+        for line in f:
+            name, decl = line.rstrip('\n').split('\t')
+            try:
+                sym = demangle(name)
+                ok = (cdecl_sym(sym) == decl and msvc_demangle_peg(name) == sym
+                    and mangle(sym) == name and msvc_mangle_format(sym) == name)
+            except Exception as e:
+                print('{}: {}'.format(name, e))
+                failures += 1
+                continue
+            if not ok:
+                print('{}: expected {}, got {}'.format(name, decl, cdecl_sym(sym)))
+                failures += 1
+    return failures
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=100000)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--template-depth', type=int, default=2)
+    ap.add_argument('--max-params', type=int, default=6)
+    ap.add_argument('--backref-density', type=float, default=0.25)
+    args = ap.parse_args()
+
+    failures = check_known()
+
+    gen = SymbolGenerator(args.seed, args.template_depth, args.max_params, args.backref_density)
+    start = time.perf_counter()
+    for sym in gen.symbols(args.count):
+        name = mangle(sym)
+        try:
+            parsed = demangle(name)
+            ok = parsed == sym and mangle(parsed) == name
+            cdecl_sym(parsed)
+        except Exception as e:
+            print('{}: {}'.format(name, e))
+            failures += 1
+            continue
+        if not ok:
+            print('{}: round trip mismatch'.format(name))
+            failures += 1
+    elapsed = time.perf_counter() - start
+
+    print('{} symbols, {} failures, {:.0f} symbols/s'.format(args.count, failures, args.count / elapsed))
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# Compares demangle_many with and without incremental parsing on sorted
+# symbol lists: one made of overload sets, whose names only differ in
+# their last parameters, and one of unrelated generated symbols, where
+# little is shared and the checkpoints are pure overhead.
+
+import argparse
+import random
+from cppmangle import mangle, demangle_many
+from cppmangle.ast import Function, FunctionType, SimpleType, t_void, t_ellipsis
+from cppmangle.generate import generate_symbols, generate_names
+from common import throughput
+
+def _is_terminator(type):
+    return isinstance(type, SimpleType) and type.basic_type in (t_void, t_ellipsis)
+
+def overload_names(count, seed):
+    # functions from the generator, each with a few overloads that
+    # replace its last parameter
+    rand = random.Random(seed)
+    fns = []
+    for sym in generate_symbols(count, seed):
+        if isinstance(sym, Function):
+            params = [param for param in sym.type.params if not _is_terminator(param)]
+            if params:
+                fns.append((sym, params))
+    pool = [param for sym, params in fns for param in params]
+
+    names = set()
+    for sym, params in fns:
+        type = sym.type
+        for _ in range(rand.randrange(1, 9)):
+            params[-1] = rand.choice(pool)
+            overload = FunctionType(type.cconv, type.ret_type, tuple(params), type.this_cv)
+            names.add(mangle(Function(sym.qname, overload, sym.kind, sym.access_spec, sym.addr_space)))
+    return sorted(names)
+
+def _throughput(names, incremental, repeat=3):
+    return throughput(lambda batch: list(demangle_many(batch, incremental=incremental)), [names], repeat) * len(names)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=20000)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    sets = [
+        ('overloads', overload_names(args.count // 4, args.seed)),
+        ('generated', sorted(generate_names(args.count, args.seed))),
+        ]
+    for label, names in sets:
+        base = _throughput(names, False)
+        incremental = _throughput(names, True)
+        print('{} ({} names):'.format(label, len(names)))
+        print('  demangle_many:             {:10.0f} symbols/s'.format(base))
+        print('  demangle_many incremental: {:10.0f} symbols/s ({:.2f}x)'.format(incremental, incremental / base))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# Measures building, saving and opening a SymbolIndex and the latency of
+# its queries, in memory and memory-mapped.
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from cppmangle import SymbolIndex
+from cppmangle.index import MappedSymbolIndex
+from cppmangle.ast import Function, fn_free
+from cppmangle.generate import generate_names
+from run import load_corpus
+
+def _latency(fn, args, repeat=3):
+    # Returns the best mean time per call, in microseconds.
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for arg in args:
+            fn(arg)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(args) * 1e6
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=200000, help='number of generated names to index')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--queries', type=int, default=1000)
+    args = ap.parse_args()
+
+    names = load_corpus() + list(generate_names(args.count, args.seed))
+    start = time.perf_counter()
+    index = SymbolIndex(names)
+    elapsed = time.perf_counter() - start
+    print('build:     {:10.0f} symbols/s ({} symbols)'.format(len(index) / elapsed, len(index)))
+
+    rnd = random.Random(args.seed)
+    sample = [index.symbol(rnd.randrange(len(index))) for _ in range(args.queries)]
+    members = [sym for sym in sample if isinstance(sym, Function) and sym.kind != fn_free]
+    _queries(index, sample, members)
+
+    fd, path = tempfile.mkstemp(suffix='.idx')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        index.save(path)
+        print('save:      {:10.2f} s, {:.1f} MiB'.format(time.perf_counter() - start, os.path.getsize(path) / 2.0**20))
+
+        start = time.perf_counter()
+        with MappedSymbolIndex(path) as mapped:
+            print('open:      {:10.3f} ms'.format((time.perf_counter() - start) * 1e3))
+            _queries(mapped, sample, members)
+    finally:
+        os.remove(path)
+
+def _queries(index, sample, members):
+    print('{}:'.format(type(index).__name__))
+    print('  overloads: {:10.1f} us/query'.format(_latency(index.overloads, [sym.qname for sym in sample])))
+    print('  members:   {:10.1f} us/query'.format(_latency(index.members, [sym.qname[:-1] for sym in members])))
+    print('  with_param:{:10.1f} us/query'.format(_latency(index.with_param, [sym.type.params[0] for sym in members])))
+    print('  find:      {:10.1f} us/query'.format(_latency(
+        lambda sym: index.find(cls=sym.qname[:-1], kind=sym.kind, param=sym.type.params[0]), members)))
+
+if __name__ == '__main__':
+    main()
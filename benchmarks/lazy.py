@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# Compares demangling with and without lazy function types on a
+# filtering workload that only looks at the name and kind of symbols,
+# and on one that also renders the symbols it keeps.
+
+import argparse
+from cppmangle import demangle, cdecl_sym
+from cppmangle.ast import Function, fn_free
+from cppmangle.generate import generate_names
+from run import load_corpus
+from common import throughput
+
+def _filter(lazy):
+    def fn(name):
+        sym = demangle(name, lazy)
+        return sym.qname[-1] == 'x' or getattr(sym, 'kind', None) == fn_free
+    return fn
+
+def _filter_render(lazy):
+    def fn(name):
+        sym = demangle(name, lazy)
+        if isinstance(sym, Function) and sym.kind == fn_free:
+            return cdecl_sym(sym)
+    return fn
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=50000)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    corpus = load_corpus()
+    sets = [
+        ('corpus', corpus * (args.count // len(corpus) + 1)),
+        ('generated', list(generate_names(args.count, args.seed))),
+        ]
+    for label, names in sets:
+        print('{}:'.format(label))
+        for workload, make in (('filter', _filter), ('filter+render', _filter_render)):
+            eager = throughput(make(False), names)
+            lazy = throughput(make(True), names)
+            print('  {:14} eager: {:10.0f} symbols/s'.format(workload, eager))
+            print('  {:14} lazy:  {:10.0f} symbols/s ({:.2f}x)'.format('', lazy, lazy / eager))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# Compares the buffer-based mangler against the string-formatting one.
+
+import argparse
+from cppmangle import demangle, mangle, mangle_many
+from cppmangle.msvc import msvc_mangle_format
+from cppmangle.generate import generate_symbols
+from common import synthetic_names, throughput
+
+def _batch_throughput(syms, repeat=3):
+    return throughput(lambda batch: list(mangle_many(batch)), [syms], repeat) * len(syms)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=100000)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    sets = [
+        ('synthetic', [demangle(name) for name in synthetic_names(args.count)]),
+        ('generated', list(generate_symbols(args.count, args.seed))),
+        ]
+    for label, syms in sets:
+        old = throughput(msvc_mangle_format, syms)
+        new = throughput(mangle, syms)
+        many = _batch_throughput(syms)
+
+        print('{}:'.format(label))
+        print('  format:      {:10.0f} symbols/s'.format(old))
+        print('  mangle:      {:10.0f} symbols/s ({:.2f}x)'.format(new, new / old))
+        print('  mangle_many: {:10.0f} symbols/s ({:.2f}x)'.format(many, many / old))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# Compares loading a synthetic MSVC linker map into a LinkerMap with
+# building a dict from addresses to demangled symbols, in time and memory,
+# checks lookups against the dict and measures lookup throughput.
+
+import argparse
+import bisect
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from cppmangle import demangle
+from cppmangle.mapfile import load_map
+from common import synthetic_names, throughput
+
+_header = '''\
+ example
+
+ Timestamp is 65a1b2c3 (Fri Jan 12 12:00:00 2024)
+
+ Preferred load address is 0000000140000000
+
+ Start         Length     Name                   Class
+ 0001:00000000 00a00000H .text$mn                CODE
+ 0002:00000000 00100000H .rdata                  DATA
+
+  Address         Publics by Value              Rva+Base               Lib:Object
+
+ 0000:00000000       __guard_fids_count         0000000000000000     <absolute>
+'''
+
+def make_map(path, count, statics):
+    # publics and statics are each sorted by address but interleave, as
+    # in maps written by the linker
+    with open(path, 'w') as f:
+        f.write(_header)
+        names = synthetic_names(count)
+        for i, name in enumerate(names):
+            if i == count - statics:
+                f.write('\n entry point at        0001:00001000\n\n Static symbols\n\n')
+            offset = 16 * i if i < count - statics else 16 * (i - count + statics) + 8
+            f.write(' 0001:{:08x}       {:<26} {:016x} f   module{}.obj\n'.format(
+                offset, name, 0x140001000 + offset, i % 97))
+        f.write('\n Exports\n\n  ordinal    name\n\n')
+
+def _load_dict(path):
+    # the approach LinkerMap replaces: every symbol demangled up front
+    syms = {}
+    in_symbols = False
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if 'Publics' in parts or parts == ['Static', 'symbols']:
+                in_symbols = True
+            elif in_symbols and len(parts) >= 3 and parts[0][4:5] == ':' and not parts[0].startswith('0000:'):
+                syms[int(parts[2], 16)] = demangle(parts[1])
+    return syms
+
+def _measure(fn, *args):
+    start = time.perf_counter()
+    r = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    r = None
+    r = fn(*args)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return r, elapsed, size, peak
+
+def check(map, syms, rand):
+    # every symbol address, the bytes right after and random addresses
+    # must resolve to the symbol the sorted dict holds
+    keys = sorted(syms)
+    probes = keys + [key + 5 for key in keys] + [rand.randrange(0x140000000, 0x140001000 + 16 * len(keys)) for _ in range(10000)]
+    bad = 0
+    for address in probes:
+        i = bisect.bisect_right(keys, address) - 1
+        expected = (keys[i], syms[keys[i]]) if i >= 0 else None
+        r = map.lookup(address)
+        if (r and (r[0], r[2])) != expected:
+            bad += 1
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=200000, help='symbols in the map')
+    ap.add_argument('--hot', type=int, default=100, help='distinct functions hit by lookups')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+    rand = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as dir:
+        path = os.path.join(dir, 'example.map')
+        make_map(path, args.count, args.count // 10)
+        print('{} symbols, {:.1f} MB'.format(args.count, os.path.getsize(path) / 1e6))
+
+        map, elapsed, size, peak = _measure(load_map, path)
+        print('LinkerMap: {:6.2f} s, {:7.1f} MiB held, {:7.1f} MiB peak'.format(elapsed, size / 2.0**20, peak / 2.0**20))
+        syms, elapsed, size, peak = _measure(_load_dict, path)
+        print('dict:      {:6.2f} s, {:7.1f} MiB held, {:7.1f} MiB peak'.format(elapsed, size / 2.0**20, peak / 2.0**20))
+
+    bad = check(map, syms, rand)
+    print('{} lookups differ from the dict'.format(bad))
+
+    hot = [map.address(rand.randrange(len(map))) + rand.randrange(16) for _ in range(args.hot)]
+    addresses = [rand.choice(hot) for _ in range(100000)]
+    print('lookup:    {:10.0f} lookups/s'.format(throughput(map.lookup, addresses)))
+    if bad:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# Measures the memory held by demangled ASTs.
+
+import argparse
+import tracemalloc
+from cppmangle import demangle
+from common import synthetic_names
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=100000)
+    args = ap.parse_args()
+
+    names = list(synthetic_names(args.count))
+
+    tracemalloc.start()
+    syms = [demangle(name) for name in names]
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('{} symbols: {:.1f} MiB held, {:.0f} bytes/symbol, {:.1f} MiB peak'.format(
+        len(syms), size / 2.0**20, float(size) / len(syms), peak / 2.0**20))
+
+if __name__ == '__main__':
+    main()
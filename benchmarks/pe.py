@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# Builds small synthetic binaries of every kind cppmangle.pe reads (PE32
+# and PE32+ images, regular and /bigobj COFF objects, archives) and checks
+# that their symbols are read back in order, then measures reading and
+# demangling the exports of a large synthetic DLL.
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from cppmangle import demangle_many, DemangleFailure
+from cppmangle.pe import symbol_names, demangle_binary
+from cppmangle.generate import generate_names
+from run import load_corpus
+
+def make_pe(names, plus=True):
+    section_rva = 0x1000
+    strings = b''.join(name.encode() + b'\0' for name in names)
+    name_table = 40
+    string_base = name_table + 4 * len(names)
+    offsets, pos = [], string_base
+    for name in names:
+        offsets.append(section_rva + pos)
+        pos += len(name.encode()) + 1
+    export = struct.pack('<12xIIIIIII', 0, 1, 0, len(names), 0, section_rva + name_table, 0)
+    section = export + struct.pack('<{}I'.format(len(names)), *offsets) + strings
+
+    opt_size = 240 if plus else 224
+    headers = 0x40 + 4 + 20 + opt_size + 40
+    dos = b'MZ' + b'\0' * 58 + struct.pack('<I', 0x40)
+    coff = struct.pack('<HHIIIHH', 0x8664 if plus else 0x14c, 1, 0, 0, 0, opt_size, 0x2022)
+    fixed = 112 if plus else 96
+    opt = struct.pack('<H', 0x20b if plus else 0x10b) + b'\0' * (fixed - 6) + struct.pack('<I', 16)
+    opt += struct.pack('<II', section_rva, len(section)) + b'\0' * (15 * 8)
+    section_header = struct.pack('<8sIIII16x', b'.edata', len(section), section_rva, len(section), headers)
+    return dos + b'PE\0\0' + coff + opt + section_header + section
+
+def _symbol_records(names, record):
+    # external symbols interleaved with static ones that carry an aux record
+    symbols, strings = [], b''
+    for i, name in enumerate(names):
+        raw = name.encode()
+        if len(raw) <= 8:
+            short = raw
+        else:
+            short = struct.pack('<II', 0, 4 + len(strings))
+            strings += raw + b'\0'
+        symbols.append(struct.pack(record, short, 0, 1, 0x20, 2, 0))
+        if i % 3 == 0:
+            symbols.append(struct.pack(record, b'.text', 0, 1, 0, 3, 1))
+            symbols.append(b'\0' * struct.calcsize(record))
+    return symbols, struct.pack('<I', 4 + len(strings)) + strings
+
+def make_object(names):
+    symbols, strings = _symbol_records(names, '<8sIhHBB')
+    header = struct.pack('<HHIIIHH', 0x8664, 0, 0, 20, len(symbols), 0, 0)
+    return header + b''.join(symbols) + strings
+
+def make_bigobj(names):
+    symbols, strings = _symbol_records(names, '<8sIiHBB')
+    class_id = bytes.fromhex('c7a1bad1eebaa94baf20faf66aa4dcb8')
+    header = struct.pack('<HHHHI16sIIIIIII', 0, 0xffff, 2, 0x8664, 0, class_id, 0, 0, 0, 0, 0, 56, len(symbols))
+    return header + b''.join(symbols) + strings
+
+def make_archive(names):
+    data = struct.pack('>I', len(names)) + struct.pack('>{}I'.format(len(names)), *([0] * len(names)))
+    data += b''.join(name.encode() + b'\0' for name in names)
+    header = b'/'.ljust(16) + b'0'.ljust(12) + b''.ljust(6) + b''.ljust(6) + b'0'.ljust(8)
+    header += str(len(data)).encode().ljust(10) + b'`\n'
+    return b'!<arch>\n' + header + data + b'\n' * (len(data) % 2)
+
+def _write(dir, name, data):
+    path = os.path.join(dir, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+def check(dir, names):
+    # the corpus mixed with C names of every length class
+    names = names + ['main', 'DllMain', '_start@12', 'exactly8', 'GetProcAddressForCaller']
+    bad = 0
+    for label, data in (
+            ('PE32+', make_pe(names)),
+            ('PE32', make_pe(names, plus=False)),
+            ('COFF', make_object(names)),
+            ('bigobj', make_bigobj(names)),
+            ('archive', make_archive(['__imp_' + name for name in names])),
+            ('empty PE', make_pe([])),
+            ('empty COFF', make_object([]))):
+        path = _write(dir, 'check.bin', data)
+        got = list(symbol_names(path))
+        expected = ['__imp_' + name for name in names] if label == 'archive' else names if 'empty' not in label else []
+        if got != expected:
+            print('{}: read {} names, expected {}'.format(label, len(got), len(expected)))
+            bad += 1
+        syms = list(demangle_binary(path))
+        if [s.name if isinstance(s, DemangleFailure) else s for s in syms] != \
+                [s.name if isinstance(s, DemangleFailure) else s for s in demangle_many(expected)]:
+            print('{}: demangle_binary differs from demangle_many'.format(label))
+            bad += 1
+    # neither a truncated header nor text may be read as a COFF object
+    for label, data in (('empty file', b''), ('short file', b'ab'), ('text', b'hello world, this is plain text\n')):
+        path = _write(dir, 'check.bin', data)
+        try:
+            list(symbol_names(path))
+        except ValueError as e:
+            if 'not a PE, COFF or archive file' in str(e):
+                continue
+        print('{}: not rejected'.format(label))
+        bad += 1
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=200000, help='exports of the large DLL')
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as dir:
+        bad = check(dir, load_corpus())
+        print('{} format checks failed'.format(bad))
+
+        names = list(generate_names(args.count, args.seed))
+        path = _write(dir, 'large.dll', make_pe(names))
+        print('{} exports, {:.1f} MB'.format(len(names), os.path.getsize(path) / 1e6))
+
+        start = time.perf_counter()
+        for _ in symbol_names(path):
+            pass
+        elapsed = time.perf_counter() - start
+        print('read exports:       {:10.0f} names/s'.format(len(names) / elapsed))
+
+        start = time.perf_counter()
+        for _ in demangle_many(names):
+            pass
+        baseline = time.perf_counter() - start
+        print('demangle_many:      {:10.0f} names/s'.format(len(names) / baseline))
+
+        start = time.perf_counter()
+        for _ in demangle_binary(path):
+            pass
+        elapsed = time.perf_counter() - start
+        print('demangle_binary:    {:10.0f} names/s ({:.0%} of demangle_many)'.format(
+            len(names) / elapsed, baseline / elapsed))
+
+    if bad:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
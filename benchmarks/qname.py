@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# Compares qualified-name-only demangling against full demangling.
+
+import argparse
+from cppmangle import demangle, demangle_qname
+from common import synthetic_names, throughput
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=100000)
+    args = ap.parse_args()
+
+    names = list(synthetic_names(args.count))
+    full = throughput(demangle, names)
+    qname = throughput(demangle_qname, names)
+
+    print('demangle:       {:10.0f} symbols/s'.format(full))
+    print('demangle_qname: {:10.0f} symbols/s ({:.1f}x)'.format(qname, qname / full))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# Measures how fast demangle_many rejects input that is not a mangled
+# name, compared with demangling valid names of similar length.
+
+import argparse
+from cppmangle import demangle_many
+from common import throughput
+
+_inputs = [
+    ('valid', '?method@Class@ns@@QAEXHPAVFoo@@@Z'),
+    ('valid, short', '?x@@3HA'),
+    ('extern "C"', '_CreateFileW@28'),
+    ('log line', '2024-01-01 12:00:00 INFO loaded 42 modules'),
+    ('truncated', '?method@Class@ns@@QAEXHPAVFoo@@'),
+    ('bad character', '?method@Class@ns@@QAEXH!AVFoo@@@Z'),
+    ('whitespace', '?method@Class with spaces@ns@@QAEXHPAVFoo@@@Z'),
+    ]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=50000)
+    args = ap.parse_args()
+
+    for label, name in _inputs:
+        names = [name] * args.count
+        rate = throughput(lambda batch: list(demangle_many(batch)), [names]) * len(names)
+        print('{:14} {:10.0f} names/s'.format(label + ':', rate))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# Runs the throughput and memory benchmarks over the symbol corpus.
+#
+# Results can be saved as JSON with --save and compared against an
+# earlier run with --compare, which reports every operation whose
+# throughput dropped by more than --threshold percent.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from cppmangle import mangle, demangle, demangle_qname, cdecl_sym
+from cppmangle.msvc import msvc_demangle_peg, msvc_mangle_format
+from cppmangle.generate import generate_names
+from common import synthetic_names, throughput
+
+_corpus_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.txt')
+
+def load_corpus(path=_corpus_path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+def _roundtrip(name):
+    return mangle(demangle(name))
+
+def _operations(names):
+    syms = [demangle(name) for name in names]
+    return [
+        ('demangle', demangle, names),
+        ('demangle_peg', msvc_demangle_peg, names),
+        ('demangle_qname', demangle_qname, names),
+        ('mangle', mangle, syms),
+        ('mangle_format', msvc_mangle_format, syms),
+        ('cdecl_sym', cdecl_sym, syms),
+        ('roundtrip', _roundtrip, names),
+        ]
+
+def _peak_memory(fn, items):
+    tracemalloc.start()
+    for item in items:
+        fn(item)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def run(names, only=None, repeat=3):
+    results = {}
+    for name, fn, items in _operations(names):
+        if only and name not in only:
+            continue
+        if name == 'demangle_peg':
+            # the speg engine is an order of magnitude slower
+            items = items[:len(items) // 10 or 1]
+        results[name] = {
+            'symbols_per_sec': throughput(fn, items, repeat),
+            'peak_bytes': _peak_memory(fn, items),
+            }
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old = baseline[name]['symbols_per_sec']
+        new = results[name]['symbols_per_sec']
+        change = 100.0 * (new - old) / old
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('{:16} {:12.0f} -> {:12.0f} symbols/s ({:+.1f}%){}'.format(name, old, new, change, flag))
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--corpus', default=_corpus_path, help='file with one mangled name per line')
+    ap.add_argument('--synthetic', type=int, default=0, metavar='N',
+        help='append N synthetic names to the corpus')
+    ap.add_argument('--generated', type=int, default=0, metavar='N',
+        help='append N randomly generated names to the corpus')
+    ap.add_argument('--seed', type=int, default=0, help='seed for --generated')
+    ap.add_argument('--min-symbols', type=int, default=20000,
+        help='repeat the corpus until it has at least this many names')
+    ap.add_argument('--repeat', type=int, default=3, help='timing runs per operation, the best one counts')
+    ap.add_argument('--only', action='append', help='run only the given operation (may be repeated)')
+    ap.add_argument('--save', metavar='FILE', help='store the results as JSON')
+    ap.add_argument('--compare', metavar='FILE', help='compare with results stored by --save')
+    ap.add_argument('--threshold', type=float, default=10.0,
+        help='throughput drop, in percent, reported as a regression')
+    args = ap.parse_args()
+
+    names = load_corpus(args.corpus) + list(synthetic_names(args.synthetic))
+    names += generate_names(args.generated, args.seed)
+    if names and len(names) < args.min_symbols:
+        names = names * (args.min_symbols // len(names) + 1)
+
+    results = run(names, args.only, args.repeat)
+    for name in sorted(results):
+        r = results[name]
+        print('{:16} {:12.0f} symbols/s {:10.1f} KiB peak'.format(
+            name, r['symbols_per_sec'], r['peak_bytes'] / 1024.0))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'symbols': len(names),
+                'results': results,
+                }, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print('')
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# Measures demangle_stream on synthetic log text with a varying share of
+# lines that contain a mangled name, in MB of text per second, and on the
+# same text with its newlines and spaces turned into tabs, which must be
+# cut elsewhere.
+
+import argparse
+import random
+import time
+from cppmangle import demangle_stream
+from cppmangle.generate import generate_names
+
+_lines = [
+    '2024-01-01 12:00:{:02}.123 [worker-3] INFO module loaded at 0x7ff6a1b20000 size=0x1f000 path=C:\\Windows\\System32\\kernel32.dll',
+    '2024-01-01 12:00:{:02}.456 [worker-1] WARN request took 1532 ms (limit 1000 ms), retrying? attempt 2 of 5',
+    '2024-01-01 12:00:{:02}.789 [main] DEBUG cache hit ratio 0.93, 18231 entries, 4096 evictions',
+    ]
+
+def make_log(size, symbol_every, distinct, seed):
+    rand = random.Random(seed)
+    names = list(generate_names(distinct, seed))
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        if symbol_every and i % symbol_every == 0:
+            line = '2024-01-01 12:00:{:02}.000 [worker-2] ERROR crash in {} + 0x{:x}'.format(
+                i % 60, rand.choice(names), rand.randrange(0x1000))
+        else:
+            line = _lines[i % len(_lines)].format(i % 60)
+        lines.append(line)
+        total += len(line) + 1
+        i += 1
+    return '\n'.join(lines) + '\n'
+
+def _chunks(text, size):
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--size', type=int, default=8 << 20, help='bytes of text per run')
+    ap.add_argument('--chunk-size', type=int, default=1 << 20)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    for label, symbol_every, distinct, tabs in (
+            ('no symbols', 0, 1, False),
+            ('1 in 1000 lines', 1000, 1000, False),
+            ('1 in 100 lines', 100, 1000, False),
+            ('1 in 10 lines', 10, 1000, False),
+            ('every line', 1, 1000, False),
+            ('every line, fresh', 1, 100000, False),
+            ('1 in 10, tabs', 10, 1000, True)):
+        text = make_log(args.size, symbol_every, distinct, args.seed)
+        if tabs:
+            text = text.replace('\n', '\t').replace(' ', '\t')
+        start = time.perf_counter()
+        for _ in demangle_stream(_chunks(text, args.chunk_size)):
+            pass
+        elapsed = time.perf_counter() - start
+        print('{:18} {:8.0f} MB/s'.format(label + ':', len(text) / elapsed / 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# Compares loading symbols from their binary serialization against
+# demangling them, and reports the size of both forms.
+
+import argparse
+from cppmangle import demangle, mangle, demangle_many, Interner
+from cppmangle.serialize import dumps, loads, dumps_many, loads_many
+from cppmangle.generate import generate_symbols
+from run import load_corpus
+from common import throughput
+
+def _batch_throughput(blob, count, repeat=3):
+    return throughput(loads_many, [blob], repeat) * count
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=50000)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    corpus = load_corpus()
+    corpus = corpus * (args.count // len(corpus) + 1)
+    generated = [mangle(sym) for sym in generate_symbols(args.count, args.seed)]
+
+    for label, names in (('corpus', corpus), ('generated', generated)):
+        syms = [demangle(name) for name in names]
+        blobs = [dumps(sym) for sym in syms]
+        blob = dumps_many(syms)
+        interned = dumps_many(list(demangle_many(names, interner=Interner())))
+
+        base = throughput(demangle, names)
+        single = throughput(loads, blobs)
+        many = _batch_throughput(blob, len(syms))
+
+        print('{}:'.format(label))
+        print('  demangle:   {:10.0f} symbols/s'.format(base))
+        print('  loads:      {:10.0f} symbols/s ({:.2f}x)'.format(single, single / base))
+        print('  loads_many: {:10.0f} symbols/s ({:.2f}x)'.format(many, many / base))
+        print('  mangled:    {:10.1f} bytes/symbol'.format(sum(map(len, names)) / len(names)))
+        print('  dumps:      {:10.1f} bytes/symbol'.format(sum(map(len, blobs)) / len(blobs)))
+        print('  dumps_many: {:10.1f} bytes/symbol ({:.1f} interned)'.format(len(blob) / len(syms), len(interned) / len(syms)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# Thread-safety stress check: demangles, mangles and renders the same
+# symbols from many threads at once and compares every result against a
+# single-threaded run. Besides independent calls, the threads share lazily
+# demangled symbols, whose types they all force at the same time, and a
+# DemangleCache. Also reports the throughput of the threaded run, which
+# only scales across cores on free-threaded Python builds.
+
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cppmangle import mangle, demangle, demangle_many, cdecl_sym, cdecl_many, DemangleCache
+from cppmangle.generate import generate_names
+from run import load_corpus
+
+def _work(names, syms, decls, lazy, cache, seed, barrier):
+    # returns the names whose results differ from the reference
+    rand = random.Random(seed)
+    order = list(range(len(names)))
+    rand.shuffle(order)
+    barrier.wait()
+
+    bad = []
+    for i in order:
+        sym = demangle(names[i])
+        if sym != syms[i] or mangle(sym) != names[i] or cdecl_sym(sym) != decls[i]:
+            bad.append(names[i])
+        elif lazy[i] != syms[i] or cache(names[i]) != decls[i]:
+            bad.append(names[i])
+
+    for i, decl in zip(order, cdecl_many(syms[i] for i in order)):
+        if decl != decls[i]:
+            bad.append(names[i])
+
+    order.sort(key=names.__getitem__)
+    for i, sym in zip(order, demangle_many([names[i] for i in order], incremental=True)):
+        if sym != syms[i]:
+            bad.append(names[i])
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=20000)
+    ap.add_argument('--threads', type=int, default=8)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    names = load_corpus() + list(generate_names(args.count, args.seed))
+    names = list(dict.fromkeys(names))
+
+    syms = [demangle(name) for name in names]
+    decls = [cdecl_sym(sym) for sym in syms]
+    lazy = [demangle(name, lazy=True) for name in names]
+    cache = DemangleCache(maxsize=len(names) // 2, render=True)
+
+    # one pass in this thread for reference; its lazy symbols and cache
+    # entries are then reset, so that the threads race to fill them
+    start = time.perf_counter()
+    bad = _work(names, syms, decls, lazy, cache, args.seed, threading.Barrier(1))
+    single = len(names) / (time.perf_counter() - start)
+    lazy = [demangle(name, lazy=True) for name in names]
+    cache.cache_clear()
+
+    barrier = threading.Barrier(args.threads)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        futures = [pool.submit(_work, names, syms, decls, lazy, cache, args.seed + i, barrier)
+            for i in range(args.threads)]
+        bad += [name for future in futures for name in future.result()]
+    elapsed = time.perf_counter() - start
+
+    for name in sorted(set(bad)):
+        print('{}: result differs from the single-threaded run'.format(name))
+    print('{} symbols x {} threads, {} mismatches'.format(len(names), args.threads, len(bad)))
+    print('one thread:  {:10.0f} symbols/s'.format(single))
+    print('all threads: {:10.0f} symbols/s'.format(len(names) * args.threads / elapsed))
+    if bad:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
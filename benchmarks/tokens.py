@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# Measures the lookup of single codes in the code tables: special names,
+# basic types and class kinds. Each code is matched at the start of a
+# short string, by the anchored regex and dict lookup the speg grammar
+# uses, by walking the trie of the fast demangler, and by the
+# first-character jump table it uses, which only walks the trie for
+# codes longer than one character.
+
+import argparse
+import random
+import re
+import time
+from cppmangle.msvc import (_trie_match, _token_re,
+    _special_names_map, _special_names_trie,
+    _basic_type_map, _basic_type_trie,
+    _class_kind_map, _class_kind_trie)
+
+def _regex(m):
+    match = re.compile(_token_re(m)).match
+    def fn(s):
+        code = match(s).group()
+        return m[code], len(code)
+    return fn
+
+def _trie(trie):
+    def fn(s):
+        return _trie_match(trie, s, 0)
+    return fn
+
+def _jump(trie):
+    def fn(s):
+        value = trie.get(s[0])
+        if isinstance(value, dict):
+            return _trie_match(value, s, 1)
+        return value, 1
+    return fn
+
+def _ns_per_token(fn, tokens, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for token in tokens:
+            fn(token)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(tokens) * 1e9
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--count', type=int, default=100000)
+    ap.add_argument('--seed', type=int, default=0)
+    args = ap.parse_args()
+
+    rand = random.Random(args.seed)
+    tables = [
+        ('special names', _special_names_map, _special_names_trie),
+        ('basic types', _basic_type_map, _basic_type_trie),
+        ('class kinds', _class_kind_map, _class_kind_trie),
+        ]
+    for label, m, trie in tables:
+        codes = list(m)
+        tokens = [rand.choice(codes) + 'H@Z' for _ in range(args.count)]
+
+        regex = _ns_per_token(_regex(m), tokens)
+        print('{}:'.format(label))
+        print('  regex + dict: {:6.0f} ns/token'.format(regex))
+        for name, fn in (('trie', _trie(trie)), ('jump table', _jump(trie))):
+            t = _ns_per_token(fn, tokens)
+            print('  {:12}  {:6.0f} ns/token ({:.2f}x)'.format(name + ':', t, regex / t))
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,7 @@
-from .mangle import mangle, demangle
-from .cdecl import cdecl_sym, cdecl_qname
+from .mangle import mangle, mangle_many, demangle, demangle_qname, demangle_many, is_mangled, DemangleFailure, DemangleError
+from .cdecl import cdecl_sym, cdecl_qname, cdecl_many
 from .ast import *
+from .cache import DemangleCache
+from .index import SymbolIndex
+from .stats import DemangleStats
+from .scan import demangle_text, demangle_stream
@@ -1,12 +1,192 @@
-from .mangle import mangle, demangle
-from .cdecl import cdecl_sym
+from .mangle import demangle_many, DemangleFailure, DemangleError
+from .cdecl import _Renderer
+from .stats import DemangleStats
+from .scan import demangle_stream
+from .pe import symbol_names
 import argparse
+import collections
+import io
+import itertools
+import multiprocessing
+import sys
+import speg
+
+_io_buffer_size = 1 << 20
+
+def _demangle_lines(names, passthrough, stats=None):
+    # With passthrough, lines that are not mangled names are copied
+    # to the output unchanged, like c++filt does. Whitespace around a
+    # mangled name is ignored.
+    render = _Renderer().sym
+    if not passthrough:
+        syms = demangle_many(names, 'raise') if stats is None else stats.demangle_many(names, 'raise')
+        for sym in syms:
+            yield render(sym)
+        return
+
+    lines, names = itertools.tee(names)
+    names = (name.strip() for name in names)
+    syms = demangle_many(names, 'return') if stats is None else stats.demangle_many(names, 'return')
+    for line, sym in zip(lines, syms):
+        if isinstance(sym, DemangleFailure):
+            yield line
+        else:
+            yield render(sym)
+
+def _demangle_chunk(names, passthrough):
+    # Runs in a worker. Returns the lines demangled before the first
+    # failure and the failure itself as plain data, which the parent
+    # raises again; an exception raised here would have to survive being
+    # pickled, and the pool stops delivering results if it does not.
+    lines = []
+    try:
+        for line in _demangle_lines(names, passthrough):
+            lines.append(line)
+    except speg.ParseError as e:
+        return lines, (e.text, e.offset, getattr(e, 'expected', None), e.msg)
+    return lines, None
+
+def _chunk_lines(result):
+    lines, error = result.get()
+    for line in lines:
+        yield line
+    if error is not None:
+        raise DemangleError(*error)
+
+def _chunks(names, size):
+    chunk = []
+    for name in names:
+        chunk.append(name)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _parallel_demangle(names, passthrough, jobs, chunk_size):
+    # Keep a bounded number of chunks in flight and collect them in
+    # submission order, so the output follows the input order and
+    # the input is never read far ahead of the workers.
+    pool = multiprocessing.Pool(jobs)
+    try:
+        pending = collections.deque()
+        for chunk in _chunks(names, chunk_size):
+            pending.append(pool.apply_async(_demangle_chunk, (chunk, passthrough)))
+            if len(pending) > 2 * jobs:
+                for line in _chunk_lines(pending.popleft()):
+                    yield line
+
+        while pending:
+            for line in _chunk_lines(pending.popleft()):
+                yield line
+    finally:
+        pool.terminate()
+
+def _read_names(f, passthrough):
+    for line in f:
+        if passthrough:
+            yield line.rstrip('\r\n')
+            continue
+
+        line = line.strip()
+        if line:
+            yield line
+
+def _read_chunks(f, size):
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            break
+        yield chunk
+
+def _surrogateescape(f):
+    # f, or a text stream over the same file, with undecodable bytes
+    # mapped to surrogates and back; reconfigure() is new in Python 3.7
+    if hasattr(f, 'reconfigure'):
+        f.reconfigure(errors='surrogateescape')
+        return f
+    if hasattr(f, 'buffer'):
+        return io.TextIOWrapper(f.buffer, f.encoding, 'surrogateescape')
+    return f
+
+def _demangle_text(args):
+    # log files are not always valid in the locale's encoding; such bytes
+    # are copied through unchanged
+    f = _surrogateescape(args.input)
+    out = _surrogateescape(args.output)
+    for chunk in demangle_stream(_read_chunks(f, _io_buffer_size)):
+        out.write(chunk)
+    out.flush()
+
+    # wrappers made by _surrogateescape would close the files of the
+    # original streams when collected
+    if f is not args.input:
+        f.detach()
+    if out is not args.output:
+        out.detach()
 
 def main():
     ap = argparse.ArgumentParser(fromfile_prefix_chars='@')
-    ap.add_argument('name', nargs='+')
+    ap.add_argument('name', nargs='*', help='mangled names; read from --input if omitted')
+    ap.add_argument('--input', '-i', type=argparse.FileType('r', _io_buffer_size), default=sys.stdin,
+        help='file to read mangled names from, one per line (default: stdin)')
+    ap.add_argument('--output', '-o', type=argparse.FileType('w', _io_buffer_size), default=sys.stdout,
+        help='file to write the declarations to (default: stdout)')
+    ap.add_argument('--passthrough', '-p', action='store_true',
+        help='copy lines that are not mangled names to the output unchanged')
+    ap.add_argument('--jobs', '-j', type=int, default=1,
+        help='number of worker processes, 0 for one per CPU')
+    ap.add_argument('--chunk-size', type=int, default=1000,
+        help='number of names sent to a worker at a time')
+    ap.add_argument('--stats', action='store_true',
+        help='print the time spent in each parser production to stderr')
+    ap.add_argument('--text', '-t', action='store_true',
+        help='treat the input as free text and demangle the names found in it in place')
+    ap.add_argument('--binary', '-b', action='append', default=[], metavar='PATH',
+        help='demangle the exports of a PE image or the symbols of a COFF object or archive; may be repeated')
     args = ap.parse_args()
 
-    for name in args.name:
-        dem = demangle(name)
-        print(cdecl_sym(dem))
+    if args.text:
+        if args.name or args.binary:
+            ap.error('names and --binary cannot be given together with --text')
+        if args.jobs != 1 or args.stats or args.passthrough:
+            ap.error('--text cannot be used together with --jobs, --stats or --passthrough')
+        _demangle_text(args)
+        return
+
+    if args.name and args.input is not sys.stdin:
+        ap.error('names cannot be given together with --input')
+    if args.binary and (args.name or args.input is not sys.stdin):
+        ap.error('--binary cannot be used together with names or --input')
+    if args.stats and args.jobs != 1:
+        ap.error('--stats cannot be used together with --jobs')
+
+    if args.binary:
+        # binaries also export C names, which are printed as they are
+        args.passthrough = True
+        names = itertools.chain.from_iterable(symbol_names(path) for path in args.binary)
+    elif args.name:
+        names = args.name
+    else:
+        names = _read_names(args.input, args.passthrough)
+
+    stats = DemangleStats() if args.stats else None
+    jobs = args.jobs if args.jobs > 0 else multiprocessing.cpu_count()
+    if jobs > 1:
+        lines = _parallel_demangle(names, args.passthrough, jobs, args.chunk_size)
+    else:
+        lines = _demangle_lines(names, args.passthrough, stats)
+
+    out = args.output
+    try:
+        for line in lines:
+            out.write(line)
+            out.write('\n')
+    except speg.ParseError as e:
+        out.flush()
+        sys.exit('{}: cannot demangle {!r} at offset {}: {}'.format(ap.prog, e.text, e.offset, e.msg))
+    out.flush()
+
+    if stats is not None:
+        sys.stderr.write(stats.report())
+        sys.stderr.write('\n')
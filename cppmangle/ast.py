@@ -1,4 +1,6 @@
 class _Enum(object):
+    __slots__ = ('desc',)
+
     def __init__(self, desc):
         self.desc = desc
 
@@ -9,6 +11,8 @@ class _Enum(object):
         return self.desc
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, _Enum):
             return self.desc == other.desc
 
@@ -17,7 +21,26 @@ class _Enum(object):
     def __hash__(self):
         return self.desc.__hash__()
 
+# AST nodes are slotted and are never modified once constructed, which
+# lets demangled symbols share them (see Interner and DemangleCache). As
+# shared nodes get hashed over and over, nodes with children cache their
+# hash in a _hash slot on first use.
+
+def _slot_state(self):
+    # the pickled state of a node: its slots without the cached hash,
+    # which depends on the hash seed of the process
+    state = {}
+    for cls in type(self).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if name != '_hash' and hasattr(self, name):
+                state[name] = getattr(self, name)
+    return None, state
+
 class Type(object):
+    __slots__ = ('cv', '_hash')
+
+    __getstate__ = _slot_state
+
     def __init__(self, cv):
         self.cv = cv
 
@@ -28,11 +51,19 @@ class Type(object):
         raise NotImplementedError()
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Type):
-            return super().__eq__(other) and self.cv == other.cv
+            return self.cv == other.cv
 
         return False
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.cv)
+
 cv_none = 0
 cv_const = 1
 cv_volatile = 2
@@ -42,6 +73,8 @@ cv_names = ('', 'const ', 'volatile ', 'const volatile ')
 class_kind_names = ('union', 'struct', 'class', 'enum')
 
 class SimpleType(Type):
+    __slots__ = ('basic_type',)
+
     def __init__(self, cv, basic_type):
         super().__init__(cv)
         self.basic_type = basic_type
@@ -50,13 +83,18 @@ class SimpleType(Type):
         return '{}{}'.format(cv_names[self.cv], str(self.basic_type))
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, SimpleType):
-            return self().__eq__(other) and self.basic_type == other.basic_type
+            return super().__eq__(other) and self.basic_type == other.basic_type
 
         return False
 
+    def __hash__(self):
+        return hash((self.cv, self.basic_type))
+
 class BasicType(_Enum):
-    pass
+    __slots__ = ()
 
 t_none = BasicType('none')
 t_void = BasicType('void')
@@ -79,6 +117,8 @@ t_longdouble = BasicType('long double')
 t_ellipsis = BasicType('...')
 
 class PtrType(Type):
+    __slots__ = ('target', 'operator', 'addr_space')
+
     def __init__(self, cv, target, operator, addr_space):
         super().__init__(cv)
         self.target = target
@@ -89,17 +129,28 @@ class PtrType(Type):
         return '{}{}'.format(str(self.target), self.operator)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, PtrType):
             return super().__eq__(other) and self.target == other.target and self.operator == other.operator and self.addr_space == other.addr_space
 
         return False
 
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.cv, self.target, self.operator, self.addr_space))
+            return self._hash
+
 k_union = 0
 k_struct = 1
 k_class = 2
 k_enum = 3
 
 class ClassType(Type):
+    __slots__ = ('kind', 'qname', 'addr_space')
+
     def __init__(self, cv, kind, qname, addr_space=None):
         super(ClassType, self).__init__(cv)
         self.kind = kind
@@ -112,12 +163,23 @@ class ClassType(Type):
         return '{}{}'.format(cv_names[self.cv], '::'.join(map(str, self.qname)))
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, ClassType):
             return super().__eq__(other) and self.kind == other.kind and self.qname == other.qname and self.addr_space == other.addr_space
 
         return False
 
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.cv, self.kind, self.qname, self.addr_space))
+            return self._hash
+
 class FunctionType(Type):
+    __slots__ = ('cconv', 'ret_type', 'params', 'this_cv')
+
     def __init__(self, cconv, ret_type, params, this_cv):
         super().__init__(cv_none)
         self.cconv = cconv
@@ -133,30 +195,60 @@ class FunctionType(Type):
             cv_names[self.this_cv])
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, FunctionType):
             return super().__eq__(other) and self.cconv == other.cconv and self.ret_type == other.ret_type and self.params == other.params and self.this_cv == other.this_cv
 
         return False
 
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.cconv, self.ret_type, self.params, self.this_cv))
+            return self._hash
+
 class ArrayType(Type):
-    def __init__(self, dims, target):
-        super().__init__(cv_none)
+    __slots__ = ('dims', 'target')
+
+    def __init__(self, dims, target, cv=cv_none):
+        super().__init__(cv)
         self.dims = dims
         self.target = target
 
+    def __str__(self):
+        return '{}{}'.format(str(self.target), ''.join('[{}]'.format(dim) for dim in self.dims))
+
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, ArrayType):
             return super().__eq__(other) and self.dims == other.dims and self.target == other.target
 
         return False
 
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.cv, self.dims, self.target))
+            return self._hash
+
 class Name(object):
+    __slots__ = ()
+
     def __repr__(self):
         return '{}({!r})'.format(__class__, self.__str__())
 
     def __eq__(self, other):
+        if self is other:
+            return True
         return self.__str__() == other.__str__()
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
     def __str__(self):
         raise NotImplementedError()
 
@@ -164,6 +256,8 @@ class Name(object):
         return self.__str__().__hash__()
 
 class SpecialName(Name):
+    __slots__ = ('desc',)
+
     def __init__(self, desc):
         self.desc = desc
 
@@ -171,16 +265,39 @@ class SpecialName(Name):
         return self.desc
 
 class RTTIName(SpecialName):
+    __slots__ = ('rtti_type',)
+
     def __init__(self, desc, rtti_type):
         self.desc = desc
         self.rtti_type = rtti_type
 
 class RTTITypeDescriptorName(RTTIName):
+    __slots__ = ('type', '_hash')
+
+    __getstate__ = _slot_state
+
     def __init__(self, desc, type=None):
         super().__init__(desc, r_rtti_type_descriptor)
         self.type = type
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, RTTITypeDescriptorName):
+            return self.desc == other.desc and self.type == other.type
+
+        return False
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.desc, self.type))
+            return self._hash
+
 class RTTIBaseClassDescriptorName(RTTIName):
+    __slots__ = ('member_displacement', 'vftable_displacement', 'displacement_within_vftable', 'attributes')
+
     def __init__(self, desc, member_displacement=0, vftable_displacement=0, displacement_within_vftable=0, attributes=0):
         super().__init__(desc, r_rtti_base_class_descriptor)
         self.member_displacement = member_displacement
@@ -294,6 +411,10 @@ n_local_static_thread_guard = SpecialName("`local static thread guard'")
 n_op_udf_literal = SpecialName("operator\"\"")
 
 class TemplateId(Name):
+    __slots__ = ('name', 'args', '_hash')
+
+    __getstate__ = _slot_state
+
     def __init__(self, name, args):
         self.name = name
         self.args = args
@@ -301,28 +422,43 @@ class TemplateId(Name):
     def __str__(self):
         return '{}<{}>'.format(self.name, ', '.join(map(str, self.args)))
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, TemplateId):
+            return self.name == other.name and self.args == other.args
+
+        return False
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.name, self.args))
+            return self._hash
+
 class CallingConv(_Enum):
-    pass
+    __slots__ = ()
 cconv_cdecl = CallingConv('cdecl')
 cconv_stdcall = CallingConv('stdcall')
 cconv_thiscall = CallingConv('thiscall')
 cconv_fastcall = CallingConv('fastcall')
 
 class AccessSpecifier(_Enum):
-    pass
+    __slots__ = ()
 access_public = AccessSpecifier('public')
 access_protected = AccessSpecifier('protected')
 access_private = AccessSpecifier('private')
 
 class FunctionKind(_Enum):
-    pass
+    __slots__ = ()
 fn_free = FunctionKind('<free fn>')
 fn_instance = FunctionKind('<non-static non-virtual member fn>')
 fn_virtual = FunctionKind('<virtual member fn>')
 fn_class_static = FunctionKind('<static member fn>')
 
 class AddressSpace(_Enum):
-    pass
+    __slots__ = ()
 as_default = AddressSpace('<default>')
 as_msvc_x64_absolute = AddressSpace('absolute')
 
@@ -339,10 +475,19 @@ sc_rtti                     = '8'
 sc_extern_c                 = '9'
 
 class Symbol(object):
+    __slots__ = ('_hash',)
+
+    __getstate__ = _slot_state
+
     def get_access_spec(self):
         pass
 
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
 class Function(Symbol):
+    __slots__ = ('qname', 'type', 'kind', 'access_spec', 'addr_space')
+
     def __init__(self, qname, type, kind, access_spec, addr_space):
         self.qname = qname
         self.type = type
@@ -353,7 +498,24 @@ class Function(Symbol):
     def get_access_spec(self):
         return self.access_spec
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, Function):
+            return self.qname == other.qname and self.type == other.type and self.kind == other.kind and self.access_spec == other.access_spec and self.addr_space == other.addr_space
+
+        return False
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.qname, self.type, self.kind, self.access_spec, self.addr_space))
+            return self._hash
+
 class Variable(Symbol):
+    __slots__ = ('qname', 'ret_type', 'cv', 'storage_class', 'addr_space')
+
     def __init__(self, qname, ret_type=None, cv=cv_none, storage_class=None, addr_space=as_default):
         self.qname = qname
         self.ret_type = ret_type
@@ -371,3 +533,89 @@ class Variable(Symbol):
         else:
             return None
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, Variable):
+            return self.qname == other.qname and self.ret_type == other.ret_type and self.cv == other.cv and self.storage_class == other.storage_class and self.addr_space == other.addr_space
+
+        return False
+
+    def __hash__(self):
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.qname, self.ret_type, self.cv, self.storage_class, self.addr_space))
+            return self._hash
+
+class Interner(object):
+    # Hash-conses AST nodes: structurally equal subtrees passed through
+    # the same interner come back as one shared object, so that equality
+    # tests between them reduce to identity tests. This relies on nodes
+    # never being modified after construction.
+
+    def __init__(self):
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def _share(self, obj):
+        # the type is part of the key so that e.g. a plain name never
+        # gets replaced by an equal-comparing SpecialName
+        return self._nodes.setdefault((type(obj), obj), obj)
+
+    def intern(self, obj):
+        if obj is None or isinstance(obj, (int, _Enum)):
+            return obj
+
+        if isinstance(obj, tuple):
+            return self._share(tuple(self.intern(item) for item in obj))
+
+        if isinstance(obj, SimpleType) or isinstance(obj, str):
+            return self._share(obj)
+
+        if isinstance(obj, PtrType):
+            target = self.intern(obj.target)
+            if target is not obj.target:
+                obj = PtrType(obj.cv, target, obj.operator, obj.addr_space)
+        elif isinstance(obj, ClassType):
+            qname = self.intern(obj.qname)
+            if qname is not obj.qname:
+                obj = ClassType(obj.cv, obj.kind, qname, obj.addr_space)
+        elif isinstance(obj, FunctionType):
+            ret_type = self.intern(obj.ret_type)
+            params = self.intern(obj.params)
+            if ret_type is not obj.ret_type or params is not obj.params:
+                obj = FunctionType(obj.cconv, ret_type, params, obj.this_cv)
+        elif isinstance(obj, ArrayType):
+            target = self.intern(obj.target)
+            if target is not obj.target:
+                obj = ArrayType(obj.dims, target, obj.cv)
+        elif isinstance(obj, TemplateId):
+            name = self.intern(obj.name)
+            args = self.intern(obj.args)
+            if name is not obj.name or args is not obj.args:
+                obj = TemplateId(name, args)
+        elif isinstance(obj, RTTITypeDescriptorName):
+            type = self.intern(obj.type)
+            if type is not obj.type:
+                obj = RTTITypeDescriptorName(obj.desc, type)
+        elif isinstance(obj, Function):
+            qname = self.intern(obj.qname)
+            if obj.__class__ is not Function:
+                # a function whose type is parsed on first access (see
+                # msvc._LazyFunction): only the name is shared, as hashing
+                # the function would parse its type
+                return obj if qname is obj.qname else obj._with_qname(qname)
+            type = self.intern(obj.type)
+            if qname is not obj.qname or type is not obj.type:
+                obj = Function(qname, type, obj.kind, obj.access_spec, obj.addr_space)
+        elif isinstance(obj, Variable):
+            qname = self.intern(obj.qname)
+            ret_type = self.intern(obj.ret_type)
+            if qname is not obj.qname or ret_type is not obj.ret_type:
+                obj = Variable(qname, ret_type, obj.cv, obj.storage_class, obj.addr_space)
+
+        return self._share(obj)
+
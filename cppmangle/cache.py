@@ -0,0 +1,25 @@
+import functools
+from .mangle import demangle
+from .cdecl import cdecl_sym
+
+def _demangle_cdecl(name):
+    return cdecl_sym(demangle(name))
+
+class DemangleCache(object):
+    # A bounded LRU cache of demangling results keyed by the mangled name.
+    # With render=True, the cache holds the C++ declarations produced
+    # by cdecl_sym instead of the AST objects. The cached AST objects
+    # are shared between callers and must not be modified.
+
+    def __init__(self, maxsize=65536, render=False):
+        self.render = render
+        self._lookup = functools.lru_cache(maxsize)(_demangle_cdecl if render else demangle)
+
+    def __call__(self, name):
+        return self._lookup(name)
+
+    def cache_info(self):
+        return self._lookup.cache_info()
+
+    def cache_clear(self):
+        self._lookup.cache_clear()
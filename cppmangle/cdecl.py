@@ -1,126 +1,212 @@
 from .ast import *
 
-def _cdecl_templ_arg(arg):
-    if isinstance(arg, int):
-        return str(arg)
-    return cdecl_type(arg)
-
-def _cdecl_name(name, prev):
-    if name == n_constructor:
-        return prev, None
-    if name == n_destructor:
-        return '~{}'.format(prev), None
-    if isinstance(name, SpecialName):
-        return str(name), None
-    if isinstance(name, TemplateId):
-        return '{}<{}>'.format(name.name, ','.join(_cdecl_templ_arg(arg) for arg in name.args)), name.name
-    return name, name
+class _Renderer(object):
+    # Renders declarations, appending the pieces of each symbol to a
+    # single output list that is joined once. The text of qualified
+    # names and of parameter and template argument types is cached so
+    # that subtrees repeated across symbols are rendered only once.
+    # Qualified names are compared structurally; types are looked up by
+    # identity, as hashing a fresh type tree costs about as much as
+    # rendering it, so they hit for subtrees shared through backreferences
+    # or an Interner. A cache that grows past cache_size entries is
+    # cleared; with cache_size=0 nothing is cached.
+
+    def __init__(self, cache_size=4096):
+        self.cache_size = cache_size
+        self._out = []
+        self._qnames = {}
+        self._types = {}
+
+    def sym(self, sym):
+        out = self._out
+        out.clear()
+        self._sym(sym)
+        return ''.join(out)
+
+    def qname(self, qname):
+        if not self.cache_size:
+            return self._render_qname(qname)
+
+        r = self._qnames.get(qname)
+        if r is None:
+            r = self._render_qname(qname)
+            if len(self._qnames) >= self.cache_size:
+                self._qnames.clear()
+            self._qnames[qname] = r
+        return r
+
+    def type(self, type, obj_name=''):
+        if obj_name:
+            prefix, suffixes = self._declarator(type, obj_name)
+            return prefix + ''.join(suffixes)
 
-def cdecl_qname(qname):
-    prefix = ''
-    names = []
-    base_name = None
-    for name in qname:
-        full_name, base_name = _cdecl_name(name, base_name)
-        if isinstance(name, RTTITypeDescriptorName):
-            if name.type is not None:
-                prefix += cdecl_type(name.type) + ' '
-        names.append(full_name)
-    return prefix + '::'.join(names)
-
-def cdecl_type(type, obj_name=''):
-    prefixes = []
-    suffixes = []
-    prio = 0
-
-    if obj_name:
-        prefixes.append(obj_name)
-
-    while True:
         if isinstance(type, SimpleType):
             if type.basic_type == t_none:
+                return ''
+            return cv_names[type.cv] + type.basic_type.desc
+
+        if not self.cache_size:
+            prefix, suffixes = self._declarator(type, '')
+            return prefix + ''.join(suffixes)
+
+        entry = self._types.get(id(type))
+        if entry is not None and entry[0] is type:
+            return entry[1]
+
+        prefix, suffixes = self._declarator(type, '')
+        r = prefix + ''.join(suffixes)
+        if len(self._types) >= self.cache_size:
+            self._types.clear()
+        self._types[id(type)] = type, r
+        return r
+
+    def _templ_arg(self, arg):
+        if isinstance(arg, int):
+            return str(arg)
+        return self.type(arg)
+
+    def _name(self, name, prev):
+        if isinstance(name, str):
+            return name, name
+        if name == n_constructor:
+            return prev, None
+        if name == n_destructor:
+            return '~{}'.format(prev), None
+        if isinstance(name, SpecialName):
+            return str(name), None
+        if isinstance(name, TemplateId):
+            return '{}<{}>'.format(name.name, ','.join(self._templ_arg(arg) for arg in name.args)), name.name
+        return name, name
+
+    def _render_qname(self, qname):
+        prefix = ''
+        names = []
+        base_name = None
+        for name in qname:
+            full_name, base_name = self._name(name, base_name)
+            if isinstance(name, RTTITypeDescriptorName):
+                if name.type is not None:
+                    prefix += self.type(name.type) + ' '
+            names.append(full_name)
+        return prefix + '::'.join(names)
+
+    def _declarator(self, type, obj_name):
+        # C declarators read inside-out: the prefixes are collected from
+        # the outermost type inwards and emitted in reverse, the suffixes
+        # are emitted in the order they were collected.
+        prefixes = []
+        suffixes = []
+        prio = 0
+
+        if obj_name:
+            prefixes.append(obj_name)
+
+        while True:
+            if isinstance(type, SimpleType):
+                if type.basic_type == t_none:
+                    break
+
+                prefixes.append(' ')
+                prefixes.append(type.basic_type.desc)
+                prefixes.append(cv_names[type.cv])
                 break
 
-            prefixes.append(' ')
-            prefixes.append(type.basic_type.desc)
-            prefixes.append(cv_names[type.cv])
-            break
-
-        if isinstance(type, ClassType):
-            prefixes.append(' ')
-            prefixes.append(cdecl_qname(type.qname))
-            prefixes.append(' ')
-            prefixes.append(class_kind_names[type.kind])
-            prefixes.append(' ')
-            prefixes.append(cv_names[type.cv].strip())
-            break
-
-        if isinstance(type, ArrayType):
-            if prio > 1:
-                prefixes.append('(')
-                suffixes.append(')')
-            prio = 1
-            for dim in type.dims:
-                suffixes.append('[{}]'.format(dim))
-            type = type.target
-            continue
-
-        if isinstance(type, PtrType):
-            prio = 2
-            prefixes.append(type.operator + ' ')
-            if type.addr_space == as_msvc_x64_absolute:
-                prefixes.append(ptr64_name)
-            prefixes.append(cv_names[type.cv])
-            type = type.target
-            continue
-
-        if isinstance(type, FunctionType):
-            if not prefixes or prefixes[-1][0] != '*':
+            if isinstance(type, ClassType):
                 prefixes.append(' ')
-            prefixes.append('__{}'.format(type.cconv.desc))
-            if prio != 0:
-                prefixes.append('(')
+                prefixes.append(self.qname(type.qname))
+                prefixes.append(' ')
+                prefixes.append(class_kind_names[type.kind])
+                prefixes.append(' ')
+                prefixes.append(cv_names[type.cv].strip())
+                break
+
+            if isinstance(type, ArrayType):
+                if prio > 1:
+                    prefixes.append('(')
+                    suffixes.append(')')
+                prio = 1
+                for dim in type.dims:
+                    suffixes.append('[{}]'.format(dim))
+                type = type.target
+                continue
+
+            if isinstance(type, PtrType):
+                prio = 2
+                prefixes.append(type.operator + ' ')
+                if type.addr_space == as_msvc_x64_absolute:
+                    prefixes.append(ptr64_name)
+                if type.cv:
+                    prefixes.append(cv_names[type.cv])
+                type = type.target
+                continue
+
+            if isinstance(type, FunctionType):
+                if not prefixes or prefixes[-1][0] != '*':
+                    prefixes.append(' ')
+                prefixes.append('__{}'.format(type.cconv.desc))
+                if prio != 0:
+                    prefixes.append('(')
+                    suffixes.append(')')
+                    prio = 0
+                suffixes.append('(')
+                suffixes.append(','.join(self.type(param) for param in type.params))
                 suffixes.append(')')
-                prio = 0
-            suffixes.append('(')
-            suffixes.append(','.join(cdecl_type(param) for param in type.params))
-            suffixes.append(')')
-            if type.this_cv is not None:
-                suffixes.append(' ')
-                suffixes.append(cv_names[type.this_cv].strip())
-            type = type.ret_type
-            continue
+                if type.this_cv:
+                    suffixes.append(' ')
+                    suffixes.append(cv_names[type.this_cv].strip())
+                type = type.ret_type
+                continue
+
+            raise RuntimeError('cdecl_type(): unknown type')
+
+        prefixes.reverse()
+        return ''.join(prefixes).strip(), suffixes
+
+    def _sym(self, sym):
+        out = self._out
+        if isinstance(sym, Function):
+            access_spec = sym.get_access_spec()
+            if access_spec is not None:
+                out.append(access_spec.desc)
+                out.append(': ')
+            if sym.kind == fn_virtual:
+                out.append('virtual ')
+            if sym.kind == fn_class_static:
+                out.append('static ')
+            prefix, suffixes = self._declarator(sym.type, self.qname(sym.qname))
+            out.append(prefix)
+            out.extend(suffixes)
+        elif isinstance(sym, Variable):
+            access_spec = sym.get_access_spec()
+            if access_spec is not None:
+                out.append(access_spec.desc)
+                out.append(': ')
+
+            if sym.storage_class >= '0' and sym.storage_class <= '7':
+                if sym.cv is not None:
+                    out.append(cv_names[sym.cv])
+
+                if sym.ret_type is not None:
+                    out.append(self.type(sym.ret_type))
+                    out.append(' ')
+
+            out.append(self.qname(sym.qname))
+        else:
+            raise RuntimeError('unk')
 
-        raise RuntimeError('cdecl_type(): unknown type')
+def cdecl_qname(qname):
+    return _Renderer(0).qname(qname)
 
-    return ''.join(reversed(prefixes)).strip() + ''.join(suffixes)
+def cdecl_type(type, obj_name=''):
+    return _Renderer(0).type(type, obj_name)
 
 def cdecl_sym(sym):
-    if isinstance(sym, Function):
-        r = []
-        access_spec = sym.get_access_spec()
-        if access_spec is not None:
-            r.extend((access_spec.desc, ': '))
-        if sym.kind == fn_virtual:
-            r.append('virtual ')
-        if sym.kind == fn_class_static:
-            r.append('static ')
-        r.append(cdecl_type(sym.type, cdecl_qname(sym.qname)))
-        return ''.join(r)
-    elif isinstance(sym, Variable):
-        r = []
-        access_spec = sym.get_access_spec()
-        if access_spec is not None:
-            r.extend((access_spec.desc, ': '))
-
-        if sym.storage_class >= '0' and sym.storage_class <= '7':
-            if sym.cv is not None:
-                r.append(cv_names[sym.cv])
-            
-            if sym.ret_type is not None:
-                r.append(cdecl_type(sym.ret_type) + ' ')
-
-        r.append(cdecl_qname(sym.qname))
-        return ''.join(r)
-
-    raise RuntimeError('unk')
+    return _Renderer(0).sym(sym)
+
+def _cdecl_many(syms, cache_size):
+    r = _Renderer(cache_size)
+    for sym in syms:
+        yield r.sym(sym)
+
+def cdecl_many(syms, cache_size=4096):
+    return _cdecl_many(syms, cache_size)
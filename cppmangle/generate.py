@@ -0,0 +1,270 @@
+import argparse
+import random
+import sys
+from .ast import *
+from .msvc import msvc_mangle, _special_names_map, _one_char_basic_types
+
+# Builds random but valid Function and Variable ASTs and mangles them.
+# The output is deterministic for a given seed and options, so it can be
+# used both as a load generator and for round-trip fuzzing of the
+# demangler.
+
+_words = (
+    'get', 'set', 'add', 'remove', 'find', 'create', 'destroy', 'update',
+    'read', 'write', 'open', 'close', 'parse', 'render', 'load', 'save',
+    'init', 'reset', 'flush', 'lock', 'unlock', 'wait', 'notify', 'run',
+    'Widget', 'Window', 'Buffer', 'Stream', 'Socket', 'Thread', 'Mutex',
+    'Node', 'Tree', 'Table', 'Entry', 'Value', 'Object', 'Handle', 'Event',
+    'Config', 'Session', 'Request', 'Response', 'Parser', 'Token', 'Scope',
+    'Vector', 'Matrix', 'Color', 'Point', 'Rect', 'Image', 'Font', 'Path',
+    )
+
+_namespaces = (
+    'std', 'detail', 'core', 'ui', 'io', 'net', 'gfx', 'math', 'util', 'os',
+    'sync', 'json', 'ast', 'impl',
+    )
+
+_basic_types = (
+    t_bool, t_char, t_schar, t_uchar, t_sshort, t_ushort, t_sint, t_uint,
+    t_slong, t_ulong, t_slonglong, t_ulonglong, t_wchar, t_float, t_double,
+    t_longdouble,
+    )
+
+_operators = tuple(name for name in _special_names_map.values()
+    if name.desc.startswith('operator'))
+
+_cconvs = (cconv_cdecl, cconv_stdcall, cconv_thiscall, cconv_fastcall)
+_accesses = (access_private, access_protected, access_public)
+_member_kinds = (fn_instance, fn_instance, fn_virtual, fn_class_static)
+_class_kinds = (k_union, k_struct, k_class, k_class, k_class, k_enum)
+
+class SymbolGenerator(object):
+    def __init__(self, seed=0, template_depth=2, max_params=6, backref_density=0.25,
+            max_type_depth=3, max_namespaces=2):
+        self.template_depth = template_depth
+        self.max_params = max_params
+        self.backref_density = backref_density
+        self.max_type_depth = max_type_depth
+        self.max_namespaces = max_namespaces
+        self._random = random.Random(seed)
+        self._rand = self._random.random
+
+        # qualified names and parameter types already used in the current
+        # symbol; reusing them produces backreferences
+        self._qnames = []
+        self._params = []
+
+    def symbol(self):
+        self._qnames = []
+        self._params = []
+        if self._rand() < 0.8:
+            return self._function()
+        return self._variable()
+
+    def name(self):
+        return msvc_mangle(self.symbol())
+
+    def symbols(self, count):
+        for i in range(count):
+            yield self.symbol()
+
+    def names(self, count):
+        for i in range(count):
+            yield msvc_mangle(self.symbol())
+
+    # random.choice and random.randrange are several times slower than
+    # scaling a single random() call, and dominate generation otherwise
+    def _below(self, n):
+        return int(self._rand() * n)
+
+    def _between(self, lo, hi):
+        return lo + int(self._rand() * (hi - lo))
+
+    def _choice(self, seq):
+        return seq[int(self._rand() * len(seq))]
+
+    def _identifier(self):
+        word = self._choice(_words)
+        if self._rand() < 0.5:
+            return '{}{}'.format(word, self._below(1000))
+        return word
+
+    def _scope(self):
+        return tuple(self._choice(_namespaces) for i in range(self._below(self.max_namespaces + 1)))
+
+    def _class_name(self, depth):
+        if depth > 0 and self._rand() < 0.3:
+            return self._template_id(depth)
+        return self._identifier()
+
+    def _template_id(self, depth):
+        args = []
+        for i in range(self._between(1, 4)):
+            if self._rand() < 0.2:
+                args.append(self._between(-16, 1 << 16))
+            else:
+                args.append(self._value_type(depth - 1, self.max_type_depth - 1))
+        return TemplateId(self._identifier(), tuple(args))
+
+    def _class_qname(self, depth):
+        if self._qnames and self._rand() < self.backref_density:
+            return self._choice(self._qnames)
+        qname = self._scope() + (self._class_name(depth),)
+        self._qnames.append(qname)
+        return qname
+
+    def _class_type(self, cv, depth):
+        kind = self._choice(_class_kinds)
+        return ClassType(cv, kind, self._class_qname(depth), None)
+
+    def _value_type(self, depth, type_depth):
+        # types that may appear as parameters and template arguments
+        r = self._rand()
+        if r < 0.35 or type_depth <= 0:
+            return SimpleType(cv_none, self._choice(_basic_types))
+        if r < 0.6:
+            return self._class_type(cv_none, depth)
+        if r < 0.8:
+            cv = self._below(4)
+            addr_space = as_msvc_x64_absolute if self._rand() < 0.2 else as_default
+            return PtrType(cv, self._pointee(depth, type_depth - 1), '*', addr_space)
+        if r < 0.95:
+            operator = '&&' if self._rand() < 0.2 else '&'
+            return PtrType(cv_none, self._pointee(depth, type_depth - 1), operator, as_default)
+        return PtrType(self._below(4), self._fn_type(depth, type_depth - 1, 0), '*', as_default)
+
+    def _pointee(self, depth, type_depth):
+        cv = self._below(4)
+        r = self._rand()
+        if r < 0.35 or type_depth <= 0:
+            return SimpleType(cv, self._choice(_basic_types + (t_void,)))
+        if r < 0.75:
+            return self._class_type(cv, depth)
+        if r < 0.85:
+            return PtrType(cv, self._pointee(depth, type_depth - 1), '*', as_default)
+        if r < 0.95:
+            dims = tuple(self._between(1, 64) for i in range(self._between(1, 3)))
+            return ArrayType(dims, SimpleType(cv_none, self._choice(_basic_types)), cv)
+        return PtrType(cv, self._fn_type(depth, type_depth - 1, 0), '*', as_default)
+
+    def _ret_type(self, depth, type_depth):
+        r = self._rand()
+        if r < 0.4:
+            return SimpleType(cv_none, t_void)
+        if r < 0.6:
+            return self._class_type(self._below(4), depth)
+        return self._value_type(depth, type_depth)
+
+    def _params_types(self, depth, type_depth):
+        count = self._below(self.max_params + 1)
+        if count == 0:
+            return (SimpleType(cv_none, t_void),)
+
+        params = []
+        for i in range(count):
+            if self._params and self._rand() < self.backref_density:
+                param = self._choice(self._params)
+            else:
+                param = self._value_type(depth, type_depth)
+                if not (isinstance(param, SimpleType) and param.basic_type in _one_char_basic_types):
+                    self._params.append(param)
+            params.append(param)
+
+        if self._rand() < 0.05:
+            params.append(SimpleType(cv_none, t_ellipsis))
+        return tuple(params)
+
+    def _fn_type(self, depth, type_depth, this_cv):
+        ret = self._ret_type(depth, type_depth)
+        return FunctionType(self._choice(_cconvs), ret, self._params_types(depth, type_depth), this_cv)
+
+    def _function(self):
+        depth = self.template_depth
+        type_depth = self.max_type_depth
+
+        if self._rand() < 0.3:
+            qname = self._scope()
+            if self._rand() < 0.1:
+                qname += (self._choice(_operators),)
+            else:
+                qname += (self._identifier(),)
+            type = self._fn_type(depth, type_depth, None)
+            return Function(qname, type, fn_free, None, as_default)
+
+        cls = self._class_qname(depth)
+        access_spec = self._choice(_accesses)
+        kind = self._choice(_member_kinds)
+        if kind == fn_class_static:
+            this_cv = None
+            addr_space = as_default
+        else:
+            this_cv = self._below(4)
+            addr_space = as_msvc_x64_absolute if self._rand() < 0.2 else as_default
+
+        r = self._rand()
+        if r < 0.1 and kind != fn_class_static:
+            name = n_constructor if r < 0.06 else n_destructor
+            ret = SimpleType(cv_none, t_none)
+            params = self._params_types(depth, type_depth) if name == n_constructor else (SimpleType(cv_none, t_void),)
+            type = FunctionType(cconv_thiscall, ret, params, this_cv)
+            return Function(cls + (name,), type, kind, access_spec, addr_space)
+
+        name = self._choice(_operators) if r < 0.2 else self._identifier()
+        type = self._fn_type(depth, type_depth, this_cv)
+        return Function(cls + (name,), type, kind, access_spec, addr_space)
+
+    def _variable(self):
+        depth = self.template_depth
+        r = self._rand()
+
+        if r < 0.1:
+            cls = self._class_qname(depth)
+            return Variable(cls + (n_vftable,), None, cv_const, sc_vftable, as_default)
+        if r < 0.15:
+            type = ClassType(cv_none, self._choice(_class_kinds), self._class_qname(depth), as_default)
+            name = RTTITypeDescriptorName(n_rtti_type_descriptor.desc, type)
+            return Variable((name,), None, cv_none, sc_rtti, as_default)
+        if r < 0.2:
+            cls = self._class_qname(depth)
+            name = RTTIBaseClassDescriptorName(n_rtti_base_class_descriptor.desc,
+                self._below(64), self._between(-1, 64), self._below(64), self._below(256))
+            return Variable(cls + (name,), None, cv_none, sc_rtti, as_default)
+
+        if r < 0.6:
+            qname = self._class_qname(depth) + (self._identifier(),)
+            storage_class = self._choice((sc_private_static_member, sc_protected_static_member, sc_public_static_member))
+        else:
+            qname = self._scope() + (self._identifier(),)
+            storage_class = sc_global
+
+        if self._rand() < 0.1:
+            dims = tuple(self._between(1, 64) for i in range(self._between(1, 3)))
+            type = ArrayType(dims, SimpleType(cv_none, self._choice(_basic_types)))
+        else:
+            type = self._value_type(depth, self.max_type_depth)
+        addr_space = as_msvc_x64_absolute if self._rand() < 0.2 else as_default
+        return Variable(qname, type, self._below(4), storage_class, addr_space)
+
+def generate_symbols(count, seed=0, **options):
+    return SymbolGenerator(seed, **options).symbols(count)
+
+def generate_names(count, seed=0, **options):
+    return SymbolGenerator(seed, **options).names(count)
+
+def main():
+    ap = argparse.ArgumentParser(description='Writes random mangled MSVC names, one per line.')
+    ap.add_argument('count', type=int)
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--template-depth', type=int, default=2)
+    ap.add_argument('--max-params', type=int, default=6)
+    ap.add_argument('--backref-density', type=float, default=0.25)
+    args = ap.parse_args()
+
+    gen = SymbolGenerator(args.seed, args.template_depth, args.max_params, args.backref_density)
+    out = sys.stdout
+    for name in gen.names(args.count):
+        out.write(name)
+        out.write('\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+import array
+import bisect
+import collections
+import mmap
+import struct
+import sys
+import speg
+from .ast import *
+from .msvc import msvc_demangle, _Demangler, _Mangler
+from .cdecl import cdecl_qname, cdecl_type
+
+# Inverted indexes over a set of mangled names.
+#
+# Every name added to a SymbolIndex gets a symbol id, its position in the
+# index. For each indexed property (the qualified name, its components,
+# the class, function kind, access specifier, calling convention and
+# parameter types) the index maps the value to a posting list: an array
+# of the ids of the symbols that have it. Ids are handed out in order,
+# so posting lists are sorted and can be intersected by bisection.
+#
+# The index keeps the mangled names only; the ASTs are discarded after
+# indexing and recreated by symbol() on demand. Keys are AST values, so
+# equal subtrees of different symbols share one entry.
+#
+# SymbolIndex.save() writes the index to a file that MappedSymbolIndex
+# opens through mmap without reading it. The file holds the string table
+# of mangled names, and for every index a table of keys sorted by their
+# encoding, each pointing to its posting list. Keys are encoded as their
+# own MSVC mangling (qualified names and types) or description (enums),
+# so every distinct type is stored once. Lookups bisect the key table
+# and return posting lists as memoryviews into the file; ASTs are
+# created only for the keys that are looked up or enumerated.
+
+def _intersect(postings):
+    postings = sorted(postings, key=len)
+    r = []
+    for id in postings[0]:
+        for p in postings[1:]:
+            i = bisect.bisect_left(p, id)
+            if i == len(p) or p[i] != id:
+                break
+        else:
+            r.append(id)
+    return r
+
+class SymbolIndex(object):
+    def __init__(self, names=()):
+        self._names = []
+        self._by_qname = collections.defaultdict(_new_postings)
+        self._by_component = collections.defaultdict(_new_postings)
+        self._by_class = collections.defaultdict(_new_postings)
+        self._by_kind = collections.defaultdict(_new_postings)
+        self._by_access = collections.defaultdict(_new_postings)
+        self._by_cconv = collections.defaultdict(_new_postings)
+        self._by_param = collections.defaultdict(_new_postings)
+
+        # maps from the rendered form of qualified names and types to the
+        # keys of the indexes above, by id() of the index, built on the
+        # first query by string
+        self._rendered = {}
+
+        self.update(names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def name(self, id):
+        return self._names[id]
+
+    def symbol(self, id):
+        return msvc_demangle(self._names[id])
+
+    def add(self, name):
+        # Indexes a single name and returns its id. Raises speg.ParseError
+        # if the name cannot be demangled.
+        return self._add(name, msvc_demangle(name))
+
+    def update(self, names):
+        # Indexes every name that can be demangled, returns the number of
+        # names that could not.
+        d = _Demangler()
+        failed = 0
+        for name in names:
+            try:
+                sym = d.demangle(name)
+            except speg.ParseError:
+                failed += 1
+                continue
+            self._add(name, sym)
+        return failed
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            _write_index(f, self._names, [getattr(self, attr) for attr, codec in _sections])
+
+    def _add(self, name, sym):
+        id = len(self._names)
+        self._names.append(name)
+        self._rendered.clear()
+
+        qname = sym.qname
+        self._by_qname[qname].append(id)
+        # template ids are also found by the name of the template
+        components = set(qname)
+        components.update([c.name for c in qname if isinstance(c, TemplateId)])
+        for component in components:
+            self._by_component[component].append(id)
+
+        access_spec = sym.get_access_spec()
+        if access_spec is not None:
+            self._by_access[access_spec].append(id)
+
+        if isinstance(sym, Function):
+            self._by_kind[sym.kind].append(id)
+            self._by_cconv[sym.type.cconv].append(id)
+            if sym.kind != fn_free:
+                self._by_class[qname[:-1]].append(id)
+            for param in set(sym.type.params):
+                self._by_param[param].append(id)
+        elif access_spec is not None:
+            # static data members
+            self._by_class[qname[:-1]].append(id)
+
+        return id
+
+    def _postings(self, index, key, render):
+        if isinstance(key, str) and render is not None:
+            rendered = self._rendered.get(id(index))
+            if rendered is None:
+                rendered = {}
+                for k in index:
+                    rendered.setdefault(render(k), []).append(k)
+                self._rendered[id(index)] = rendered
+            keys = rendered.get(key, ())
+            if len(keys) == 1:
+                return index[keys[0]]
+            return array.array('I', sorted(id for k in keys for id in index[k]))
+        return index.get(key, _empty)
+
+    def overloads(self, qname):
+        # symbols with the given qualified name, e.g. ('ns', 'Foo', 'bar')
+        # or 'ns::Foo::bar'
+        return list(self._postings(self._by_qname, _qname_key(qname), cdecl_qname))
+
+    def members(self, cls):
+        # member functions and static data members of the given class
+        return list(self._postings(self._by_class, _qname_key(cls), cdecl_qname))
+
+    def with_param(self, type):
+        # functions taking a parameter of the given type, either an AST
+        # type or its rendering by cdecl_type, e.g. 'int const *'
+        return list(self._postings(self._by_param, type, cdecl_type))
+
+    def find(self, qname=None, component=None, cls=None, kind=None, access=None, cconv=None, param=None):
+        # Returns the ids of the symbols that match all given criteria.
+        postings = []
+        if qname is not None:
+            postings.append(self._postings(self._by_qname, _qname_key(qname), cdecl_qname))
+        if component is not None:
+            postings.append(self._postings(self._by_component, component, None))
+        if cls is not None:
+            postings.append(self._postings(self._by_class, _qname_key(cls), cdecl_qname))
+        if kind is not None:
+            postings.append(self._postings(self._by_kind, kind, None))
+        if access is not None:
+            postings.append(self._postings(self._by_access, access, None))
+        if cconv is not None:
+            postings.append(self._postings(self._by_cconv, cconv, None))
+        if param is not None:
+            postings.append(self._postings(self._by_param, param, cdecl_type))
+
+        if not postings:
+            return list(range(len(self._names)))
+        return _intersect(postings)
+
+_empty = array.array('I')
+
+class MappedSymbolIndex(SymbolIndex):
+    # A read-only SymbolIndex backed by a file written by SymbolIndex.save().
+    # Opening it maps the file and reads the header only. The mapping is
+    # held until close() or the end of a with block; an open mapping keeps
+    # the file from being deleted or replaced on Windows.
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._buf = memoryview(self._mm)
+
+        magic, count, offsets, blob = _header.unpack_from(buf, 0)
+        if magic != _magic:
+            raise ValueError('{} is not a symbol index file'.format(path))
+
+        self._names = _MappedNames(buf, count, offsets, blob)
+        pos = _header.size
+        for attr, codec in _sections:
+            setattr(self, attr, _MappedPostings(buf, codec, *_section_header.unpack_from(buf, pos)))
+            pos += _section_header.size
+        self._rendered = {}
+
+    def close(self):
+        # Unmaps the file; the index cannot be queried afterwards.
+        if self._mm is not None:
+            self._buf.release()
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, name):
+        raise TypeError('a mapped symbol index is read-only')
+
+    def update(self, names):
+        raise TypeError('a mapped symbol index is read-only')
+
+class _MappedNames(object):
+    def __init__(self, buf, count, offsets, blob):
+        self._buf = buf
+        self._count = count
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, id):
+        if not 0 <= id < self._count:
+            raise IndexError('symbol id out of range')
+        start, end = _offset_pair.unpack_from(self._buf, self._offsets + 8 * id)
+        return bytes(self._buf[self._blob + start:self._blob + end]).decode('utf-8')
+
+class _MappedPostings(object):
+    # A read-only mapping from keys to posting lists stored in an index
+    # file. Keys that cannot be encoded are not found.
+
+    def __init__(self, buf, codec, count, entries, keys, postings):
+        self._buf = buf
+        self._codec = codec
+        self._count = count
+        self._entries = entries
+        self._keys = keys
+        self._postings = postings
+
+    def __len__(self):
+        return self._count
+
+    def _entry(self, i):
+        return _entry.unpack_from(self._buf, self._entries + _entry.size * i)
+
+    def _key(self, entry):
+        return bytes(self._buf[self._keys + entry[0]:self._keys + entry[0] + entry[1]])
+
+    def _posting_list(self, entry):
+        start = self._postings + entry[2]
+        r = self._buf[start:start + 4 * entry[3]].cast('I')
+        if sys.byteorder != 'little':
+            r = array.array('I', r)
+            r.byteswap()
+        return r
+
+    def get(self, key, default=None):
+        try:
+            encoded = self._codec.encode(key)
+        except (AttributeError, KeyError, RuntimeError):
+            return default
+
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(self._entry(mid)) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            entry = self._entry(lo)
+            if self._key(entry) == encoded:
+                return self._posting_list(entry)
+        return default
+
+    def __getitem__(self, key):
+        r = self.get(key)
+        if r is None:
+            raise KeyError(key)
+        return r
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._codec.decode(self._key(self._entry(i)))
+
+# The file starts with the header, followed by one section header per
+# index, in the order of _sections. All offsets are from the start of
+# the file, except those in the entries, which are relative to the start
+# of the keys or postings of their section. Integers are little-endian.
+_magic = b'CPPMIDX1'
+_header = struct.Struct('<8sQQQ')           # magic, symbol count, name offsets, name blob
+_section_header = struct.Struct('<QQQQ')    # entry count, entries, keys, postings
+_entry = struct.Struct('<QIQI')             # key offset, key length, postings offset, posting count
+_offset_pair = struct.Struct('<QQ')
+
+class _QnameCodec(object):
+    def __init__(self, component=False):
+        self._component = component
+
+    def encode(self, key):
+        if self._component:
+            key = (key,)
+        return _Mangler().qname_fragment(key).encode('utf-8')
+
+    def decode(self, data):
+        qname = _Demangler().parse_qname_fragment(data.decode('utf-8'))
+        return qname[0] if self._component else qname
+
+class _TypeCodec(object):
+    def encode(self, key):
+        if not isinstance(key, Type):
+            raise KeyError(key)
+        return _Mangler().type_fragment(key).encode('utf-8')
+
+    def decode(self, data):
+        return _Demangler().parse_type_fragment(data.decode('utf-8'))
+
+class _EnumCodec(object):
+    def __init__(self, *values):
+        self._values = dict((value.desc, value) for value in values)
+
+    def encode(self, key):
+        if self._values.get(key.desc) != key:
+            raise KeyError(key)
+        return key.desc.encode('utf-8')
+
+    def decode(self, data):
+        return self._values[data.decode('utf-8')]
+
+_sections = (
+    ('_by_qname', _QnameCodec()),
+    ('_by_component', _QnameCodec(component=True)),
+    ('_by_class', _QnameCodec()),
+    ('_by_kind', _EnumCodec(fn_free, fn_instance, fn_virtual, fn_class_static)),
+    ('_by_access', _EnumCodec(access_private, access_protected, access_public)),
+    ('_by_cconv', _EnumCodec(cconv_cdecl, cconv_stdcall, cconv_thiscall, cconv_fastcall)),
+    ('_by_param', _TypeCodec()),
+    )
+
+def _little_endian(a):
+    if sys.byteorder != 'little':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+def _write_index(f, names, indexes):
+    # everything is laid out in memory first; the sections are small
+    # compared to the posting lists, which are written as they are
+    blob = bytearray()
+    offsets = array.array('Q', [0])
+    for name in names:
+        blob += name.encode('utf-8')
+        offsets.append(len(blob))
+
+    pos = _header.size + _section_header.size * len(indexes)
+    f.write(_header.pack(_magic, len(names), pos, pos + 8 * len(offsets)))
+
+    sections = []
+    pos += 8 * len(offsets) + len(blob)
+    for index, (attr, codec) in zip(indexes, _sections):
+        keys = sorted(((codec.encode(key), key) for key in index), key=lambda e: e[0])
+        entries = bytearray()
+        key_blob = bytearray()
+        posting_count = 0
+        for encoded, key in keys:
+            n = len(index[key])
+            entries += _entry.pack(len(key_blob), len(encoded), 4 * posting_count, n)
+            key_blob += encoded
+            posting_count += n
+
+        sections.append((index, keys, entries, key_blob))
+        f.write(_section_header.pack(len(keys), pos, pos + len(entries), pos + len(entries) + len(key_blob)))
+        pos += len(entries) + len(key_blob) + 4 * posting_count
+
+    f.write(_little_endian(offsets))
+    f.write(blob)
+    for index, keys, entries, key_blob in sections:
+        f.write(entries)
+        f.write(key_blob)
+        for encoded, key in keys:
+            f.write(_little_endian(array.array('I', index[key])))
+
+def _new_postings():
+    return array.array('I')
+
+def _qname_key(qname):
+    if isinstance(qname, list):
+        return tuple(qname)
+    return qname
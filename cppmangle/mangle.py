@@ -1,7 +1,19 @@
-from .msvc import msvc_mangle, msvc_demangle
+from .msvc import msvc_mangle, msvc_mangle_many, msvc_demangle, msvc_demangle_qname, msvc_demangle_many, msvc_is_mangled, DemangleFailure, DemangleError
 
 def mangle(name):
     return msvc_mangle(name)
 
-def demangle(obj):
-    return msvc_demangle(obj)
+def mangle_many(objs):
+    return msvc_mangle_many(objs)
+
+def demangle(obj, lazy=False):
+    return msvc_demangle(obj, lazy)
+
+def demangle_qname(obj):
+    return msvc_demangle_qname(obj)
+
+def demangle_many(objs, errors='return', interner=None, lazy=False, incremental=False):
+    return msvc_demangle_many(objs, errors, interner, lazy, incremental)
+
+def is_mangled(obj):
+    return msvc_is_mangled(obj)
@@ -0,0 +1,124 @@
+import array
+import bisect
+import io
+import speg
+from .msvc import msvc_demangle
+
+# Address lookup over the symbols of an MSVC linker map (/MAP).
+#
+# A LinkerMap reads the 'Publics by Value' and 'Static symbols' sections of
+# a map file line by line and keeps, for every symbol, its address (the
+# Rva+Base column) in an array and its mangled name in a single string,
+# delimited by a second array of offsets. Nothing else is kept per symbol,
+# so a map of a million symbols takes tens of megabytes, where a dict of
+# demangled symbols takes close to a gigabyte.
+#
+# Symbols are sorted by address, and the symbol containing an address is
+# the last one that starts at or before it, found by bisection. Names are
+# demangled when first looked up; the result is cached, as crash reports
+# tend to hit the same few functions. Absolute symbols (section 0000) have
+# no address in the image and are left out.
+
+_io_buffer_size = 1 << 20
+
+class LinkerMap(object):
+    def __init__(self, lines=()):
+        self.preferred_load_address = None
+        self._addresses = array.array('Q')
+        self._offsets = array.array('Q', [0])
+        self._blob = ''
+        self._syms = {}
+        self._read(lines)
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def address(self, id):
+        return self._addresses[id]
+
+    def name(self, id):
+        return self._blob[self._offsets[id]:self._offsets[id + 1]]
+
+    def symbol(self, id):
+        # The demangled symbol, or None if the name is not a mangled
+        # C++ name.
+        try:
+            return self._syms[id]
+        except KeyError:
+            pass
+        try:
+            sym = msvc_demangle(self.name(id))
+        except speg.ParseError:
+            sym = None
+        self._syms[id] = sym
+        return sym
+
+    def find(self, address):
+        # The id of the symbol containing address, or None if address lies
+        # before the first symbol.
+        id = bisect.bisect_right(self._addresses, address) - 1
+        return id if id >= 0 else None
+
+    def lookup(self, address):
+        # Returns (symbol address, name, symbol) for the symbol containing
+        # address, or None; symbol is as returned by symbol().
+        id = self.find(address)
+        if id is None:
+            return None
+        return self._addresses[id], self.name(id), self.symbol(id)
+
+    def _read(self, lines):
+        addresses = self._addresses
+        offsets = self._offsets
+        blob = io.StringIO()
+        in_symbols = False
+        end = 0
+        last = 0
+        ordered = True
+
+        for line in lines:
+            parts = line.split(None, 3)
+            if in_symbols and len(parts) >= 3 and parts[0][4:5] == ':':
+                if parts[0].startswith('0000:'):
+                    continue
+                address = int(parts[2], 16)
+                if address < last:
+                    ordered = False
+                last = address
+                addresses.append(address)
+                end += blob.write(parts[1])
+                offsets.append(end)
+                continue
+
+            # a header line: 'Publics by Value' and 'Static symbols' open a
+            # list of symbols, 'entry point at' and 'Exports' close one
+            line = line.strip()
+            if 'Publics by Value' in line or line == 'Static symbols':
+                in_symbols = True
+            elif line.startswith('entry point at') or line == 'Exports':
+                in_symbols = False
+            elif line.startswith('Preferred load address is'):
+                self.preferred_load_address = int(line.split()[-1], 16)
+
+        self._blob = blob.getvalue()
+        if not ordered:
+            self._sort()
+
+    def _sort(self):
+        # static symbols follow the publics, each list sorted on its own;
+        # sorts by address and rewrites the names in that order
+        order = sorted(range(len(self._addresses)), key=self._addresses.__getitem__)
+        addresses = array.array('Q', (self._addresses[id] for id in order))
+        offsets = array.array('Q', [0])
+        blob = io.StringIO()
+        end = 0
+        for id in order:
+            end += blob.write(self.name(id))
+            offsets.append(end)
+        self._addresses = addresses
+        self._offsets = offsets
+        self._blob = blob.getvalue()
+
+def load_map(path):
+    with open(path, 'r', _io_buffer_size, errors='replace') as f:
+        return LinkerMap(f)
@@ -1,3 +1,4 @@
+import re
 import speg
 from .ast import *
 
@@ -28,6 +29,9 @@ _basic_type_map = {
 
 _basic_type_map_inv = _transpose(_basic_type_map)
 
+# parameters of these types are never entered into the backreference table
+_one_char_basic_types = frozenset(t for code, t in _basic_type_map.items() if len(code) == 1)
+
 _cc_map = {
     'A': cconv_cdecl,
     'E': cconv_thiscall,
@@ -139,25 +143,40 @@ _special_names_rtti_map = {
     '4': n_rtti_complete_object_locator
     }
 
+def _token_re(codes):
+    # matches exactly one of the codes; the alternatives are tried
+    # longest first, so that a code never matches a prefix of a longer one
+    return '|'.join(re.escape(code) for code in sorted(codes, key=len, reverse=True))
+
+# The terminals of the speg grammar below, derived from the code tables so
+# that every matched code is in its table.
+_special_name_re = r'\?(?:{})'.format(_token_re(list(_special_names_map) + ['_R']))
+_rtti_name_re = _token_re(_special_names_rtti_map)
+_basic_type_re = _token_re(_basic_type_map)
+_class_kind_re = _token_re(_class_kind_map)
+_cc_re = _token_re(_cc_map)
+
 def _p_simple_name(p):
     nl = p.get('names')
-    with p:
-        ref = int(p(r'\d'))
-        return nl[ref]
+    ref = p.opt(r'\d')
+    if ref is not None:
+        if int(ref) >= len(nl):
+            p.error(err='name backreference {} out of range'.format(ref))
+        return nl[int(ref)]
 
     with p:
-        special_name = p(r'\?_{0,2}[0-9A-Z]')[1:]
+        special_name = p(_special_name_re)[1:]
         if special_name == '_R':
             return _p_rtti_name(p)
 
         return _special_names_map[special_name]
 
-    n = p(r'[^@]+@')[:-1]
+    n = p(r'[^@\s\x00-\x1f]+@')[:-1]
     p.set_global('names', nl + (n,))
     return n
 
 def _p_rtti_name(p):
-    rtti_type = p('[0-4]')
+    rtti_type = p(_rtti_name_re)
     ret = _special_names_rtti_map[rtti_type]
 
     if isinstance(ret, RTTITypeDescriptorName):
@@ -182,14 +201,17 @@ def _p_int(p):
 
     return -r if neg else r
 
-def _p_name(p):
+def _p_name(p, memorize=True):
     if p.opt(r'\?\$'):
+        # template arguments get a backreference scope of their own,
+        # which starts with the name of the template
+        nl = p.get('names')
+        tl = p.get('param_types')
+        p.set_global('names', ())
+        p.set_global('param_types', ())
+
         # Parse the template name, e.g. 'name' from name<args>
         name = _p_simple_name(p)
-        
-        # get a copy of the names list for us to restore to after
-        # names loaded from the template should be scoped to this point
-        nl = p.get('names')
 
         # parse the template arguments
         type_args = []
@@ -200,27 +222,36 @@ def _p_name(p):
                 arg, _ = p(_p_type)
                 type_args.append(arg)
 
-        # reset the names list back to the point of the template's name
-        p.set('names', nl)
-        return TemplateId(name, type_args)
+        # restore the enclosing scope, the whole template id
+        # can be referenced from it unless it names the symbol itself
+        templ = TemplateId(name, tuple(type_args))
+        p.set_global('names', nl + (templ,) if memorize else nl)
+        p.set_global('param_types', tl)
+        return templ
 
     return _p_simple_name(p)
 
-def _p_qname(p):
+def _p_qname(p, symbol=False):
+    # In the name of a symbol, a template id as the innermost component
+    # (the name of the function or variable itself) is not added to the
+    # backreference table; in type names and enclosing scopes it is.
     qname = []
     with p:
         while not p.opt('@'):
-            qname.append(_p_name(p))
+            qname.append(_p_name(p, bool(qname) or not symbol))
             p.commit()
     return tuple(qname[::-1])
 
-def _p_basic_type(p):
-    c = p(r'[@XDCEFGHIJKMNOZ]|_[NJKW]')
-    return SimpleType(0, _basic_type_map[c]), len(c) >= 2
+def _p_basic_type(p, cv=cv_none):
+    c = p(_basic_type_re)
+    return SimpleType(cv, _basic_type_map[c]), len(c) >= 2
 
-_cvs = [cv_none, cv_const, cv_volatile, cv_const | cv_volatile]
+_cvs = (cv_none, cv_const, cv_volatile, cv_const | cv_volatile)
 
-def _p_type(p, consume_break = True):
+def _p_type(p, consume_break = True, cv = None):
+    # `cv` overrides the cv-qualification of the parsed type when it is
+    # dictated by the enclosing production (pointer targets, return types),
+    # so that nodes are never modified after construction.
     addr_space = as_default
     target_cv = cv_none
 
@@ -229,70 +260,70 @@ def _p_type(p, consume_break = True):
 
     # check for modified types
     # this should really only be used situationally
-    if p(r'[\?]?'):
+    modified = p(r'[\?]?')
+    if modified:
         addr_space, target_cv = _p_get_modifier(p)
 
     with p:
-        kind = p('T|U|V|W4')[0]
-        kind = ord(kind) - ord('T')
+        kind = _class_kind_map[p(_class_kind_re)]
 
         # we should always store backrefs to type names
         qname = _p_qname(p)
-        return ClassType(target_cv, kind, qname, addr_space), True
+        return ClassType(target_cv if cv is None else cv, kind, qname, addr_space if modified else None), True
 
     with p:
         # arrays
         p('Y')
         dim_count = p(_p_int)
-        dims = tuple(p(_p_int) for i in xrange(dim_count))
+        dims = tuple(p(_p_int) for i in range(dim_count))
         target, reg = p(_p_type)
-        return ArrayType(dims, target), True
+        return ArrayType(dims, target, cv_none if cv is None else cv), True
 
     with p:
         # pointer to fn
-        cv = _cvs[ord(p('[PQRS]6')[0]) - ord('P')]
+        ptr_cv = _cvs[ord(p('[PQRS]6')[0]) - ord('P')]
         fn_type = p(_p_fn_type)
-        return PtrType(cv, fn_type, '*', addr_space), True
+        return PtrType(ptr_cv if cv is None else cv, fn_type, '*', addr_space), True
 
     with p:
         # pointer types
         operator = None
-        cv = 0
+        ptr_cv = 0
 
         if p.opt('\$\$Q'):
             operator = '&&'
         else:
             kind = p('[APQRS]')
-            cv = _cvs[ord(kind) - ord('P')] if kind != 'A' else 0
+            ptr_cv = _cvs[ord(kind) - ord('P')] if kind != 'A' else 0
             operator = '&' if kind == 'A' else '*'
 
         addr_space, target_cv = _p_get_modifier(p)
 
-        target, reg = p(_p_type)
-        target.cv = target_cv
+        target, reg = p(_p_type, True, target_cv)
 
-        return PtrType(cv, target, operator, addr_space), True
+        return PtrType(ptr_cv if cv is None else cv, target, operator, addr_space), True
 
-    return p(_p_basic_type)
+    return p(_p_basic_type, cv_none if cv is None else cv)
 
 def _is_void_or_ellipsis(type):
     return isinstance(type, SimpleType) and type.basic_type in (t_void, t_ellipsis)
 
-def _p_fn_type(p):
-    cconv = _cc_map[p('[AEGI]')] #if qname[-1] not in _noncv_member_funcs else cconv_thiscall
+def _p_fn_type(p, this_cv=0):
+    cconv = _cc_map[p(_cc_re)] #if qname[-1] not in _noncv_member_funcs else cconv_thiscall
 
     ret_cv = p(r'(\?[A-D])?')
-    ret, reg = p(_p_type, False)
-    if ret_cv:
-        ret.cv = ord(ret_cv[1]) - ord('A')
+    ret, reg = p(_p_type, False, ord(ret_cv[1]) - ord('A') if ret_cv else None)
 
     params = []
 
     with p:
         while not p.opt('@'):
             with p:
-                reg_ref = p('\d')
-                param_type = p.get('param_types')[int(reg_ref)]
+                reg_ref = int(p(r'\d'))
+                param_types = p.get('param_types')
+                if reg_ref >= len(param_types):
+                    p.error(err='parameter backreference {} out of range'.format(reg_ref))
+                param_type = param_types[reg_ref]
 
             if not p:
                 param_type, reg = p(_p_type)
@@ -306,26 +337,24 @@ def _p_fn_type(p):
                 break
 
     p('Z')
-    return FunctionType(cconv, ret, params, 0)
+    return FunctionType(cconv, ret, tuple(params), this_cv)
 
 def _p_root(p):
     p.set_global('names', ())
     p.set_global('param_types', ())
 
     p(r'\?')
-    qname = _p_qname(p)
+    qname = _p_qname(p, True)
 
     # consume class specifier if applicable
     # TODO: handle me properly
     p('@?')
 
-    with p:
-        return _p_root_function(p, qname)
-
-    with p:
+    # the symbol type decides between the two, so that a malformed
+    # symbol fails where it stops matching instead of after trying both
+    if p.opt(r'(?=\d)') is not None:
         return _p_root_variable(p, qname)
-
-    raise RuntimeError('Unknown symbol type')
+    return _p_root_function(p, qname)
 
 def _p_root_function(p, qname):
     # non-member function
@@ -352,37 +381,755 @@ def _p_root_function(p, qname):
         addr_space = as_default
         this_cv = None
 
-    type = p(_p_fn_type)
+    type = p(_p_fn_type, this_cv)
     p(p.eof)
 
-    type.this_cv = this_cv
-
     return Function(qname, type, kind, access_class, addr_space)
 
 def _p_root_variable(p, qname):
-    ret = Variable(qname)
-    ret.storage_class = p('[0-9]')
+    storage_class = p('[0-9]')
+    ret_type = None
+    cv = cv_none
+    addr_space = as_default
 
     # >= sc_private_static_member <= sc_static_local
-    if ret.storage_class >= '0' and ret.storage_class <= '5':
-        ret.ret_type, _ = p(_p_type)
-        ret.addr_space, ret.cv = _p_get_modifier(p)
-    elif ret.storage_class == sc_vftable or ret.storage_class == sc_vbtable:
-        ret.addr_space, ret.cv = _p_get_modifier(p)
+    if storage_class >= '0' and storage_class <= '5':
+        ret_type, _ = p(_p_type)
+        addr_space, cv = _p_get_modifier(p)
+    elif storage_class == sc_vftable or storage_class == sc_vbtable:
+        addr_space, cv = _p_get_modifier(p)
         is_structor = True if p(r'[@]?') else False
         if not is_structor:
-            ret.ret_type, _ = p(_p_type)
+            ret_type, _ = p(_p_type)
 
     p(p.eof)
-    return ret
+    return Variable(qname, ret_type, cv, storage_class, addr_space)
 
 def _p_get_modifier(p):
     addr_space = as_msvc_x64_absolute if p('E?') else as_default
     cv = ord(p('[A-D]')) - ord('A')
     return addr_space, cv
 
-def msvc_demangle(s):
-    return speg.peg(s, _p_root)
+def msvc_demangle_peg(s):
+    try:
+        return speg.peg(s, _p_root)
+    except speg.ParseError as e:
+        raise DemangleError(s, e.offset, None, e.msg) from None
+
+def _build_trie(m):
+    trie = {}
+    for code, value in m.items():
+        node = trie
+        for ch in code[:-1]:
+            node = node.setdefault(ch, {})
+        node[code[-1]] = value
+    return trie
+
+def _trie_match(trie, s, pos):
+    node = trie
+    while True:
+        node = node.get(s[pos])
+        pos += 1
+        if not isinstance(node, dict):
+            return node, pos
+
+# The code tables of the fast demangler, as tries of nested dicts keyed
+# by character. The first level of each doubles as a first-character jump
+# table: most codes are one character long, and their value is found by
+# a single lookup without walking the trie.
+_basic_type_trie = _build_trie(_basic_type_map)
+_class_kind_trie = _build_trie(_class_kind_map)
+_special_names_trie = _build_trie(dict(
+    _special_names_map,
+    **dict(('_R' + k, v) for k, v in _special_names_rtti_map.items())))
+
+class _Demangler(object):
+    # A single-pass demangler: walks the string once by index and
+    # dispatches on the next character, never backtracking. It produces
+    # the same AST as the speg grammar above.
+    #
+    # With lazy=True, the type of a function symbol is left unparsed:
+    # the returned Function keeps the rest of the mangled name along with
+    # the backreference tables at that point and parses it when its type
+    # is first accessed. Errors in that part of the name are then raised
+    # by the access rather than by demangle().
+
+    def __init__(self, lazy=False):
+        self.lazy = lazy
+        self._s = ''
+        self._pos = 0
+        self._names = ()
+        self._param_types = ()
+
+    def demangle(self, s):
+        return self._parse(s, self._root)
+
+    def demangle_qname(self, s):
+        return self._parse(s, self._root_qname)
+
+    def parse_qname_fragment(self, s):
+        # a bare qualified name, as produced by _Mangler.qname_fragment
+        return self._parse(s, self._qname_fragment)
+
+    def parse_type_fragment(self, s):
+        # a bare type, as produced by _Mangler.type_fragment
+        return self._parse(s, self._type_fragment)
+
+    def parse_lazy_fn_type(self, s, pos, names, param_types, this_cv):
+        # resumes parsing the type of a function left unparsed by a lazy
+        # demangle, with the backreference tables captured at that point
+        return self._parse(s, lambda: self._lazy_fn_type(this_cv), pos, names, param_types)
+
+    def _parse(self, s, production, pos=0, names=(), param_types=()):
+        self._s = s
+        self._pos = pos
+        self._names = names
+        self._param_types = param_types
+        try:
+            return production()
+        except IndexError:
+            pass
+
+        # every production indexes past the end on truncated input; the
+        # error is raised outside the handler so that it does not keep the
+        # IndexError and its frames as context
+        self._pos = len(s)
+        self._fail('more input')
+
+    def _fail(self, expected):
+        raise DemangleError(self._s, self._pos, expected)
+
+    def _expect(self, ch):
+        if self._s[self._pos] != ch:
+            self._fail(ch)
+        self._pos += 1
+
+    def _root(self):
+        self._expect('?')
+        return self._root_symbol(self._qname(True))
+
+    def _root_symbol(self, qname):
+        s = self._s
+        if s.startswith('@', self._pos):
+            self._pos += 1
+
+        c = s[self._pos]
+        if '0' <= c <= '9':
+            ret = self._root_variable(qname)
+        else:
+            ret = self._root_function(qname)
+
+        if self._pos != len(s):
+            self._fail('end of input')
+        return ret
+
+    def _root_qname(self):
+        # stops right after the qualified name, leaving the
+        # type of the symbol unparsed
+        self._expect('?')
+        return self._qname(True)
+
+    def _qname_fragment(self):
+        qname = self._qname()
+        if self._pos != len(self._s):
+            self._fail('end of input')
+        return qname
+
+    def _type_fragment(self):
+        type, _ = self._type(False)
+        if self._pos != len(self._s):
+            self._fail('end of input')
+        return type
+
+    def _root_function(self, qname):
+        kind, access_class, addr_space, this_cv = self._fn_symbol_type()
+
+        if self.lazy:
+            s = self._s
+            fn = _LazyFunction(qname, kind, access_class, addr_space, this_cv,
+                s, self._pos, self._names, self._param_types)
+            self._pos = len(s)
+            return fn
+
+        type = self._fn_type(this_cv)
+        return Function(qname, type, kind, access_class, addr_space)
+
+    def _fn_symbol_type(self):
+        c = self._s[self._pos]
+        if c == 'Y' or c == 'Z':
+            access_class = None
+            kind = fn_free
+        elif 'A' <= c <= 'V':
+            modif = ord(c) - ord('A')
+            access_class = (access_private, access_protected, access_public)[modif // 8]
+            modif = modif % 8
+            if modif in (2, 3):
+                kind = fn_class_static
+            elif modif in (4, 5):
+                kind = fn_virtual
+            else:
+                kind = fn_instance
+        else:
+            self._fail('symbol type')
+        self._pos += 1
+
+        if kind is fn_instance or kind is fn_virtual:
+            addr_space, this_cv = self._modifier()
+        else:
+            addr_space = as_default
+            this_cv = None
+        return kind, access_class, addr_space, this_cv
+
+    def _lazy_fn_type(self, this_cv):
+        type = self._fn_type(this_cv)
+        if self._pos != len(self._s):
+            self._fail('end of input')
+        return type
+
+    def _root_variable(self, qname):
+        s = self._s
+        storage_class = s[self._pos]
+        self._pos += 1
+
+        ret_type = None
+        cv = cv_none
+        addr_space = as_default
+        if storage_class <= '5':
+            ret_type, _ = self._type()
+            addr_space, cv = self._modifier()
+        elif storage_class == sc_vftable or storage_class == sc_vbtable:
+            addr_space, cv = self._modifier()
+            if s.startswith('@', self._pos):
+                self._pos += 1
+            else:
+                ret_type, _ = self._type()
+
+        return Variable(qname, ret_type, cv, storage_class, addr_space)
+
+    def _qname(self, symbol=False):
+        # see _p_qname for the backreference of the innermost component
+        s = self._s
+        qname = []
+        if symbol and s[self._pos] != '@':
+            qname.append(self._name(False))
+        while s[self._pos] != '@':
+            qname.append(self._name())
+        self._pos += 1
+
+        qname.reverse()
+        return tuple(qname)
+
+    def _name(self, memorize=True):
+        s = self._s
+        if not s.startswith('?$', self._pos):
+            return self._simple_name()
+        self._pos += 2
+
+        # template arguments get a backreference scope of their own,
+        # which starts with the name of the template
+        nl = self._names
+        tl = self._param_types
+        self._names = ()
+        self._param_types = ()
+
+        name = self._simple_name()
+        type_args = []
+        while s[self._pos] != '@':
+            if s.startswith('$0', self._pos):
+                self._pos += 2
+                type_args.append(self._int())
+            else:
+                arg, _ = self._type()
+                type_args.append(arg)
+        self._pos += 1
+
+        templ = TemplateId(name, tuple(type_args))
+        self._names = nl + (templ,) if memorize else nl
+        self._param_types = tl
+        return templ
+
+    def _simple_name(self):
+        s = self._s
+        pos = self._pos
+        c = s[pos]
+
+        if '0' <= c <= '9':
+            ref = ord(c) - ord('0')
+            if ref >= len(self._names):
+                self._fail('name backreference')
+            self._pos = pos + 1
+            return self._names[ref]
+
+        if c == '?':
+            name = _special_names_trie.get(s[pos + 1])
+            end = pos + 2
+            if isinstance(name, dict):
+                name, end = _trie_match(name, s, end)
+            if name is None:
+                self._fail('special name')
+            self._pos = end
+            if isinstance(name, RTTIName):
+                return self._rtti_name(name)
+            return name
+
+        end = s.find('@', pos)
+        if end <= pos:
+            self._fail('name')
+        n = s[pos:end]
+        if ' ' in n or not n.isprintable():
+            # whitespace and control characters never appear in names
+            self._pos = pos + next(i for i, ch in enumerate(n) if ch == ' ' or not ch.isprintable())
+            self._fail('name character')
+        self._names += (n,)
+        self._pos = end + 1
+        return n
+
+    def _rtti_name(self, name):
+        if isinstance(name, RTTITypeDescriptorName):
+            type, _ = self._type()
+            return RTTITypeDescriptorName(name.desc, type)
+        elif isinstance(name, RTTIBaseClassDescriptorName):
+            return RTTIBaseClassDescriptorName(name.desc, self._int(), self._int(), self._int(), self._int())
+        return name
+
+    def _int(self):
+        s = self._s
+        pos = self._pos
+        neg = s[pos] == '?'
+        if neg:
+            pos += 1
+
+        c = s[pos]
+        if '0' <= c <= '9':
+            r = ord(c) - ord('0') + 1
+            pos += 1
+        else:
+            end = s.find('@', pos)
+            if end <= pos:
+                self._pos = pos
+                self._fail('number')
+            r = 0
+            for ch in s[pos:end]:
+                if not 'A' <= ch <= 'P':
+                    self._pos = pos
+                    self._fail('hex digit')
+                r = 16*r + (ord(ch) - ord('A'))
+            pos = end + 1
+
+        self._pos = pos
+        return -r if neg else r
+
+    def _modifier(self):
+        s = self._s
+        pos = self._pos
+        if s[pos] == 'E':
+            addr_space = as_msvc_x64_absolute
+            pos += 1
+        else:
+            addr_space = as_default
+
+        c = s[pos]
+        if not 'A' <= c <= 'D':
+            self._pos = pos
+            self._fail('cv qualifier')
+        self._pos = pos + 1
+        return addr_space, ord(c) - ord('A')
+
+    def _type(self, consume_break=True, cv=None):
+        s = self._s
+        if consume_break and s[self._pos] == '@':
+            self._pos += 1
+
+        # addr_space stays None for types without the '?' modifier
+        addr_space = None
+        target_cv = cv_none
+        if s[self._pos] == '?':
+            self._pos += 1
+            addr_space, target_cv = self._modifier()
+
+        pos = self._pos
+        entry = self._type_dispatch.get(s[pos])
+        if isinstance(entry, BasicType):
+            self._pos = pos + 1
+            return SimpleType(cv_none if cv is None else cv, entry), False
+        if isinstance(entry, dict):
+            basic_type, end = _trie_match(entry, s, pos + 1)
+            if basic_type is None:
+                self._fail('type')
+            self._pos = end
+            return SimpleType(cv_none if cv is None else cv, basic_type), True
+        if entry is None:
+            self._fail('type')
+        return entry(self, addr_space, target_cv, cv)
+
+    def _class_type(self, addr_space, target_cv, cv):
+        s = self._s
+        pos = self._pos
+        kind = _class_kind_trie.get(s[pos])
+        end = pos + 1
+        if isinstance(kind, dict):
+            kind, end = _trie_match(kind, s, end)
+        if kind is None:
+            self._fail('class kind')
+        self._pos = end
+        qname = self._qname()
+        return ClassType(target_cv if cv is None else cv, kind, qname, addr_space), True
+
+    def _array_type(self, addr_space, target_cv, cv):
+        self._pos += 1
+        dim_count = self._int()
+        dims = tuple(self._int() for i in range(dim_count))
+        target, reg = self._type()
+        return ArrayType(dims, target, cv_none if cv is None else cv), True
+
+    def _ptr_type(self, addr_space, target_cv, cv):
+        s = self._s
+        pos = self._pos
+        kind = s[pos]
+        if kind == '$':
+            if not s.startswith('$$Q', pos):
+                self._fail('$$Q')
+            operator = '&&'
+            ptr_cv = cv_none
+            self._pos = pos + 3
+        elif kind == 'A':
+            operator = '&'
+            ptr_cv = cv_none
+            self._pos = pos + 1
+        else:
+            ptr_cv = _cvs[ord(kind) - ord('P')]
+            if s[pos + 1] == '6':
+                # pointer to fn
+                self._pos = pos + 2
+                fn_type = self._fn_type()
+                if addr_space is None:
+                    addr_space = as_default
+                return PtrType(ptr_cv if cv is None else cv, fn_type, '*', addr_space), True
+            operator = '*'
+            self._pos = pos + 1
+
+        addr_space, target_cv = self._modifier()
+        target, reg = self._type(True, target_cv)
+        return PtrType(ptr_cv if cv is None else cv, target, operator, addr_space), True
+
+    def _fn_type(self, this_cv=0):
+        cconv, ret = self._fn_signature()
+
+        s = self._s
+        params = []
+        while s[self._pos] != '@':
+            # _param(), inlined as this loop is hot
+            c = s[self._pos]
+            if '0' <= c <= '9':
+                ref = ord(c) - ord('0')
+                if ref >= len(self._param_types):
+                    self._fail('type backreference')
+                param_type = self._param_types[ref]
+                self._pos += 1
+            else:
+                param_type, reg = self._type()
+                if reg:
+                    self._param_types += (param_type,)
+
+            params.append(param_type)
+            if _is_void_or_ellipsis(param_type):
+                break
+        else:
+            self._pos += 1
+
+        self._expect('Z')
+        return FunctionType(cconv, ret, tuple(params), this_cv)
+
+    def _fn_signature(self):
+        # the calling convention and the return type
+        s = self._s
+        cconv = _cc_map.get(s[self._pos])
+        if cconv is None:
+            self._fail('calling convention')
+        self._pos += 1
+
+        ret_cv = None
+        if s[self._pos] == '?' and 'A' <= s[self._pos + 1:self._pos + 2] <= 'D':
+            ret_cv = ord(s[self._pos + 1]) - ord('A')
+            self._pos += 2
+        ret, reg = self._type(False, ret_cv)
+        return cconv, ret
+
+    def _param(self):
+        c = self._s[self._pos]
+        if '0' <= c <= '9':
+            ref = ord(c) - ord('0')
+            if ref >= len(self._param_types):
+                self._fail('type backreference')
+            self._pos += 1
+            return self._param_types[ref]
+
+        param_type, reg = self._type()
+        if reg:
+            self._param_types += (param_type,)
+        return param_type
+
+# First-character jump table of types: the entry is the basic type of a
+# one-character code, the trie of the two-character basic type codes that
+# start with the character, or the handler of a compound type.
+_type_dispatch = dict(_basic_type_trie)
+_type_dispatch.update({
+    'T': _Demangler._class_type,
+    'U': _Demangler._class_type,
+    'V': _Demangler._class_type,
+    'W': _Demangler._class_type,
+    'Y': _Demangler._array_type,
+    'A': _Demangler._ptr_type,
+    'P': _Demangler._ptr_type,
+    'Q': _Demangler._ptr_type,
+    'R': _Demangler._ptr_type,
+    'S': _Demangler._ptr_type,
+    '$': _Demangler._ptr_type,
+    })
+
+_Demangler._type_dispatch = _type_dispatch
+
+# kinds of _PrefixDemangler checkpoints
+_cp_name = 0        # after a component of the qualified name
+_cp_qname = 1       # after the qualified name
+_cp_param = 2       # after the return type or a parameter of a function
+
+class _PrefixDemangler(_Demangler):
+    # Demangles a sequence of names, resuming each from the state the
+    # previous name reached at the end of their common prefix, as sorted
+    # symbol lists have long runs of names that only differ late, e.g.
+    # overloads of one function.
+    #
+    # The state of the parser is recorded at checkpoints: after every
+    # component of the qualified name of the symbol, after the qualified
+    # name and, for functions, after the return type and every parameter.
+    # The state at a checkpoint only depends on the characters consumed
+    # before it. _marks holds the positions of the checkpoints of the
+    # previous name; _states holds, for each, its kind, the backreference
+    # tables, the qualified name or the function parsed so far, and the
+    # number of entries of _components (innermost first) or _params that
+    # belong to it. A name equal to the previous one returns the previous
+    # result.
+
+    def __init__(self, lazy=False):
+        super().__init__(lazy)
+        self._prev = None
+        self._result = None
+        self._marks = []
+        self._states = []
+        self._components = []
+        self._params = []
+
+    def demangle(self, s):
+        if s == self._prev and self._result is not None:
+            return self._result
+        self._result = None
+        self._result = self._parse(s, self._root)
+        return self._result
+
+    def _root(self):
+        s = self._s
+        marks = self._marks
+        states = self._states
+
+        # the last checkpoint before which s matches the previous name;
+        # matching prefixes are monotonic, so the checkpoints are bisected
+        prev = self._prev
+        i = -1
+        hi = len(marks) - 1
+        while i < hi:
+            mid = (i + hi + 1) // 2
+            mark = marks[mid]
+            if s[:mark] == prev[:mark]:
+                i = mid
+            else:
+                hi = mid - 1
+        self._prev = s
+
+        if i < 0:
+            del marks[:], states[:]
+            self._expect('?')
+            marks.append(self._pos)
+            states.append((_cp_name, (), (), None, 0))
+            i = 0
+        else:
+            del marks[i + 1:], states[i + 1:]
+
+        kind, self._names, self._param_types, value, count = states[i]
+        self._pos = marks[i]
+        if kind == _cp_param:
+            del self._params[count:]
+            return self._root_params(value)
+
+        if kind == _cp_name:
+            components = self._components
+            del components[count:]
+            while s[self._pos] != '@':
+                components.append(self._name(bool(components)))
+                marks.append(self._pos)
+                states.append((_cp_name, self._names, self._param_types, None, len(components)))
+            self._pos += 1
+
+            value = tuple(reversed(components))
+            marks.append(self._pos)
+            states.append((_cp_qname, self._names, self._param_types, value, 0))
+        return self._root_symbol(value)
+
+    def _root_function(self, qname):
+        if self.lazy:
+            return super()._root_function(qname)
+
+        kind, access_class, addr_space, this_cv = self._fn_symbol_type()
+        cconv, ret = self._fn_signature()
+        head = (qname, kind, access_class, addr_space, this_cv, cconv, ret)
+        del self._params[:]
+        self._marks.append(self._pos)
+        self._states.append((_cp_param, self._names, self._param_types, head, 0))
+        return self._root_params(head)
+
+    def _root_params(self, head):
+        s = self._s
+        marks = self._marks
+        states = self._states
+        params = self._params
+        while s[self._pos] != '@':
+            param_type = self._param()
+            params.append(param_type)
+            if _is_void_or_ellipsis(param_type):
+                break
+            marks.append(self._pos)
+            states.append((_cp_param, self._names, self._param_types, head, len(params)))
+        else:
+            self._pos += 1
+
+        self._expect('Z')
+        if self._pos != len(s):
+            self._fail('end of input')
+        qname, kind, access_class, addr_space, this_cv, cconv, ret = head
+        type = FunctionType(cconv, ret, tuple(params), this_cv)
+        return Function(qname, type, kind, access_class, addr_space)
+
+class _LazyFunction(Function):
+    # A Function whose type is parsed on first access, see _Demangler.
+    # The slot inherited for the type stays empty, the parsed type is
+    # kept in _type. Everything needed to parse it is kept in the _span
+    # tuple, which is dropped once _type is set; a thread that sees the
+    # span gone reads the type set by another one.
+
+    __slots__ = ('_span', '_type')
+
+    def __init__(self, qname, kind, access_spec, addr_space, this_cv, s, pos, names, param_types):
+        self.qname = qname
+        self.kind = kind
+        self.access_spec = access_spec
+        self.addr_space = addr_space
+        self._span = (s, pos, names, param_types, this_cv)
+        self._type = None
+
+    @property
+    def type(self):
+        type = self._type
+        if type is None:
+            span = self._span
+            if span is None:
+                return self._type
+            type = self._type = _Demangler().parse_lazy_fn_type(*span)
+            self._span = None
+        return type
+
+    def _with_qname(self, qname):
+        # a copy under an equal qname, e.g. one shared by an Interner,
+        # whose type is still parsed on first access
+        fn = _LazyFunction.__new__(_LazyFunction)
+        fn.qname = qname
+        fn.kind = self.kind
+        fn.access_spec = self.access_spec
+        fn.addr_space = self.addr_space
+        fn._span = self._span
+        fn._type = self._type
+        return fn
+
+    def __reduce__(self):
+        # pickled and copied as a plain Function, as the type property
+        # cannot be restored through the inherited slot
+        return Function, (self.qname, self.type, self.kind, self.access_spec, self.addr_space)
+
+def msvc_demangle(s, lazy=False):
+    return _Demangler(lazy).demangle(s)
+
+def msvc_demangle_qname(s):
+    return _Demangler().demangle_qname(s)
+
+class DemangleError(speg.ParseError):
+    # Raised by the demangler at the first character that cannot continue
+    # a mangled name. offset is the index of that character in text, and
+    # expected describes what was expected there, e.g. 'type' or '@'; it
+    # is None for errors of the speg grammar, whose message holds the
+    # pattern that failed to match.
+
+    def __init__(self, text, offset, expected, msg=None):
+        if msg is None:
+            msg = 'expected {!r}, found {!r}'.format(expected, text[offset:offset + 4])
+        super().__init__(msg, text, offset, 1, offset + 1)
+        self.expected = expected
+
+    def __reduce__(self):
+        # args holds what ParseError was given, not the arguments above
+        return type(self), (self.text, self.offset, self.expected, self.msg)
+
+_mangled_re = re.compile(r'\?[^@\s\x00-\x1f]*@[^\s\x00-\x1f]*\Z')
+
+def msvc_is_mangled(s):
+    # A cheap check, without parsing, whether s can be a mangled name: it
+    # starts with '?', contains an '@' and no whitespace or control
+    # characters. A name that passes may still fail to demangle.
+    return _mangled_re.match(s) is not None
+
+class DemangleFailure(object):
+    def __init__(self, name, error):
+        self.name = name
+        self.error = error
+
+    @property
+    def offset(self):
+        return getattr(self.error, 'offset', None)
+
+    def __repr__(self):
+        return 'DemangleFailure({!r}, {!r})'.format(self.name, self.error)
+
+    def __str__(self):
+        return '{}: {}'.format(self.name, self.error)
+
+def _demangle_many(d, names, errors, interner):
+    for name in names:
+        if name.startswith('?'):
+            try:
+                sym = d.demangle(name)
+            except speg.ParseError as e:
+                # a returned error would keep the parser frames alive
+                # through its traceback
+                error = e if errors == 'raise' else e.with_traceback(None)
+            else:
+                yield sym if interner is None else interner.intern(sym)
+                continue
+        else:
+            # rejected without parsing, which saves raising the error
+            # through the parser for input such as extern "C" names
+            error = DemangleError(name, 0, '?')
+
+        if errors == 'raise':
+            raise error
+        if errors == 'return':
+            yield DemangleFailure(name, error)
+
+def _check_errors(errors):
+    if errors not in ('return', 'raise', 'skip'):
+        raise ValueError('errors must be one of \'return\', \'raise\' or \'skip\'')
+
+def msvc_demangle_many(names, errors='return', interner=None, lazy=False, incremental=False):
+    _check_errors(errors)
+    d = _PrefixDemangler(lazy) if incremental else _Demangler(lazy)
+    return _demangle_many(d, names, errors, interner)
 
 def _m_int(arg):
     r = []
@@ -404,14 +1151,15 @@ def _m_int(arg):
         r.append('@')
     return ''.join(r)
 
-def _m_templ_arg(arg):
+def _m_templ_arg(arg, nl, tl):
     if isinstance(arg, int):
         return '$0{}'.format(_m_int(arg))
-    return _m_type(arg, {}, {})
+    return _m_type(arg, nl, tl)
 
-def _m_qname(qname, nl):
+def _m_qname(qname, nl, symbol=False):
+    # see _p_qname for the backreference of the innermost component
     r = []
-    for name in qname[::-1]:
+    for i, name in enumerate(qname[::-1]):
         pos = nl.get(name)
         if pos is not None:
             r.append(str(pos))
@@ -433,10 +1181,18 @@ def _m_qname(qname, nl):
         elif isinstance(name, SpecialName):
             r.append('?{}'.format(_special_names_map_inv[name]))
         elif isinstance(name, TemplateId):
-            r.append('?${}@{}@'.format(name.name, ''.join(_m_templ_arg(arg) for arg in name.args)))
+            # template arguments get a backreference scope of their own,
+            # which starts with the name of the template
+            tnl = {}
+            ttl = {}
+            r.append('?${}{}@'.format(
+                _m_qname((name.name,), tnl)[:-1],
+                ''.join(_m_templ_arg(arg, tnl, ttl) for arg in name.args)))
+            if len(nl) < 10 and (i > 0 or not symbol):
+                nl[name] = len(nl)
         else:
             r.append('{}@'.format(name))
-            if len(nl) < 9:
+            if len(nl) < 10:
                 nl[name] = len(nl)
 
     return '{}@'.format(''.join(r))
@@ -487,31 +1243,31 @@ def _m_fn_type(type, nl, tl):
 
     ret = '{}{}'.format(ret_cv, _m_type(type.ret_type, nl, tl))
 
+    # the backreference table is keyed by the parameter types themselves,
+    # they compare structurally, so every parameter is encoded only once
     params = []
     for param in type.params:
-        cannon = _m_type(param, {}, {})
-        if len(cannon) == 1:
-            params.append(cannon)
+        if isinstance(param, SimpleType) and param.basic_type in _one_char_basic_types:
+            params.append(_basic_type_map_inv[param.basic_type])
             continue
 
-        ref = tl.get(cannon)
+        ref = tl.get(param)
         if ref is not None:
             params.append(str(ref))
             continue
 
-        p = _m_type(param, nl, tl)
-        params.append(p)
-        if len(tl) < 9:
-            tl[cannon] = len(tl)
+        params.append(_m_type(param, nl, tl))
+        if len(tl) < 10:
+            tl[param] = len(tl)
 
     term = '' if type.params and _is_void_or_ellipsis(type.params[-1]) else '@'
     return '{}{}{}{}Z'.format(cconv, ret, ''.join(params), term)
 
-def msvc_mangle(obj):
+def msvc_mangle_format(obj):
     nl = {}
     tl = {}
     if isinstance(obj, Function):
-        qname = _m_qname(obj.qname, nl)
+        qname = _m_qname(obj.qname, nl, True)
         type = _m_fn_type(obj.type, nl, tl)
 
         if obj.kind == fn_free:
@@ -538,7 +1294,7 @@ def msvc_mangle(obj):
         return '?{}{}{}{}{}'.format(qname, modif, addr_space, this_cv, type)
 
     elif isinstance(obj, Variable):
-        qname = _m_qname(obj.qname, nl)
+        qname = _m_qname(obj.qname, nl, True)
         ret = '?{}{}'.format(qname, obj.storage_class)
 
         ret_cv = ''
@@ -559,3 +1315,231 @@ def msvc_mangle(obj):
         return ret
 
     raise RuntimeError('unknown obj')
+
+class _Mangler(object):
+    # Appends the pieces of the encoding to a single list as it walks
+    # the AST and joins them once at the end, instead of formatting
+    # a string for every node. The list is reused between symbols.
+    # Produces the same output as msvc_mangle_format above.
+
+    def __init__(self):
+        self._out = []
+        self._names = {}
+        self._param_types = {}
+
+    def mangle(self, obj):
+        return self._emit(self._root, obj)
+
+    def qname_fragment(self, qname):
+        # the encoding of a qualified name on its own, with
+        # backreferences relative to its start
+        return self._emit(self._qname, qname)
+
+    def type_fragment(self, type):
+        return self._emit(self._type, type)
+
+    def _emit(self, production, obj):
+        out = self._out
+        out.clear()
+        self._names = {}
+        self._param_types = {}
+        production(obj)
+        return ''.join(out)
+
+    def _root(self, obj):
+        out = self._out
+        if isinstance(obj, Function):
+            out.append('?')
+            self._qname(obj.qname, True)
+
+            if obj.kind == fn_free:
+                out.append('Y')
+            else:
+                if obj.kind == fn_class_static:
+                    modif = 2
+                elif obj.kind == fn_virtual:
+                    modif = 4
+                else:
+                    modif = 0
+
+                if obj.access_spec == access_protected:
+                    modif += 8
+                elif obj.access_spec == access_public:
+                    modif += 16
+
+                out.append(chr(ord('A') + modif))
+
+            if obj.kind in (fn_instance, fn_virtual):
+                out.append(_m_addr_space(obj.addr_space))
+                out.append(_m_cv(obj.type.this_cv))
+
+            self._fn_type(obj.type)
+
+        elif isinstance(obj, Variable):
+            out.append('?')
+            self._qname(obj.qname, True)
+            out.append(obj.storage_class)
+
+            if obj.storage_class >= '0' and obj.storage_class <= '5':
+                self._var_type(obj)
+                self._var_cv(obj)
+            elif obj.storage_class == sc_vftable or obj.storage_class == sc_vbtable:
+                self._var_cv(obj)
+                self._var_type(obj)
+
+        else:
+            raise RuntimeError('unknown obj')
+
+    def _var_type(self, obj):
+        if obj.ret_type is None:
+            self._out.append('@')
+        else:
+            self._type(obj.ret_type)
+
+    def _var_cv(self, obj):
+        if obj.cv is not None:
+            self._out.append(_m_addr_space(obj.addr_space))
+            self._out.append(_m_cv(obj.cv))
+
+    def _qname(self, qname, symbol=False):
+        # see _p_qname for the backreference of the innermost component
+        last = len(qname) - 1
+        for i in range(last, -1, -1):
+            self._name(qname[i], i < last or not symbol)
+        self._out.append('@')
+
+    def _name(self, name, memorize=True):
+        out = self._out
+        names = self._names
+        pos = names.get(name)
+        if pos is not None:
+            out.append(str(pos))
+            return
+
+        if isinstance(name, str):
+            out.append(name)
+            out.append('@')
+            if len(names) < 10:
+                names[name] = len(names)
+        elif isinstance(name, RTTIBaseClassDescriptorName):
+            out.append('?_R')
+            out.append(str(name.rtti_type))
+            out.append(_m_int(name.member_displacement))
+            out.append(_m_int(name.vftable_displacement))
+            out.append(_m_int(name.displacement_within_vftable))
+            out.append(_m_int(name.attributes))
+        elif isinstance(name, RTTITypeDescriptorName):
+            out.append('?_R')
+            out.append(str(name.rtti_type))
+            tl = self._param_types
+            self._param_types = {}
+            self._type(name.type)
+            self._param_types = tl
+        elif isinstance(name, RTTIName):
+            out.append('?_R')
+            out.append(str(name.rtti_type))
+        elif isinstance(name, SpecialName):
+            out.append('?')
+            out.append(_special_names_map_inv[name])
+        elif isinstance(name, TemplateId):
+            # template arguments get a backreference scope of their own,
+            # which starts with the name of the template
+            tl = self._param_types
+            self._names = {}
+            self._param_types = {}
+
+            out.append('?$')
+            self._name(name.name)
+            for arg in name.args:
+                if isinstance(arg, int):
+                    out.append('$0')
+                    out.append(_m_int(arg))
+                else:
+                    self._type(arg)
+            out.append('@')
+
+            self._names = names
+            self._param_types = tl
+            if memorize and len(names) < 10:
+                names[name] = len(names)
+        else:
+            out.append(str(name))
+            out.append('@')
+            if len(names) < 10:
+                names[name] = len(names)
+
+    def _type(self, type):
+        out = self._out
+        if isinstance(type, SimpleType):
+            out.append(_basic_type_map_inv[type.basic_type])
+        elif isinstance(type, PtrType):
+            if type.operator == '&&':
+                out.append('$$Q')
+            elif type.operator == '&':
+                out.append('A')
+            else:
+                out.append('PQRS'[type.cv])
+
+            target = type.target
+            if isinstance(target, FunctionType):
+                out.append('6')
+                self._fn_type(target)
+            else:
+                out.append(_m_addr_space(type.addr_space))
+                out.append(_m_cv(target.cv))
+                self._type(target)
+        elif isinstance(type, ArrayType):
+            out.append('Y')
+            out.append(_m_int(len(type.dims)))
+            for dim in type.dims:
+                out.append(_m_int(dim))
+            self._type(type.target)
+        elif isinstance(type, ClassType):
+            if type.addr_space is not None:
+                out.append('?')
+                out.append(_m_addr_space(type.addr_space))
+                out.append(_m_cv(type.cv))
+            out.append(_class_kind_map_inv[type.kind])
+            self._qname(type.qname)
+        else:
+            raise RuntimeError('whoops')
+
+    def _fn_type(self, type):
+        out = self._out
+        out.append(_cc_map_inv[type.cconv])
+
+        ret_type = type.ret_type
+        if isinstance(ret_type, ClassType):
+            out.append('?')
+            out.append(_m_cv(ret_type.cv))
+        self._type(ret_type)
+
+        tl = self._param_types
+        for param in type.params:
+            if isinstance(param, SimpleType) and param.basic_type in _one_char_basic_types:
+                out.append(_basic_type_map_inv[param.basic_type])
+                continue
+
+            ref = tl.get(param)
+            if ref is not None:
+                out.append(str(ref))
+                continue
+
+            self._type(param)
+            if len(tl) < 10:
+                tl[param] = len(tl)
+
+        if not (type.params and _is_void_or_ellipsis(type.params[-1])):
+            out.append('@')
+        out.append('Z')
+
+def msvc_mangle(obj):
+    return _Mangler().mangle(obj)
+
+def _mangle_many(objs):
+    m = _Mangler()
+    for obj in objs:
+        yield m.mangle(obj)
+
+def msvc_mangle_many(objs):
+    return _mangle_many(objs)
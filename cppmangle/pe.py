@@ -0,0 +1,197 @@
+import mmap
+import struct
+from .mangle import demangle_many
+
+# Reads symbol names straight out of Windows binaries: the export table of
+# PE images (.dll, .exe), the symbol table of COFF objects (.obj, regular
+# and /bigobj) and the linker member of archives (.lib, both static and
+# import libraries).
+#
+# Files are mapped into memory and the tables are walked in place with
+# struct.unpack_from; only the bytes of each name are copied, when it is
+# decoded. Names are yielded as they are found, so they can be fed to
+# demangle_many without holding the whole table.
+#
+# Names are yielded as stored, including the '__imp_' prefix of import
+# symbols in archives and the leading underscore or '@' of the decorated
+# names of C functions on x86. Malformed files raise ValueError.
+
+_dos_header = struct.Struct('<2s58xI')          # e_magic, e_lfanew
+_file_header = struct.Struct('<HHIIIHH')        # Machine, NumberOfSections, TimeDateStamp, PointerToSymbolTable, NumberOfSymbols, SizeOfOptionalHeader, Characteristics
+_section_header = struct.Struct('<8sIIII16x')   # Name, VirtualSize, VirtualAddress, SizeOfRawData, PointerToRawData
+_export_directory = struct.Struct('<12xIIIIIII') # Name, Base, NumberOfFunctions, NumberOfNames, AddressOfFunctions, AddressOfNames, AddressOfNameOrdinals
+_bigobj_header = struct.Struct('<HHHHI16sIIIIIII')
+_symbol = struct.Struct('<8sIhHBB')             # Name, Value, SectionNumber, Type, StorageClass, NumberOfAuxSymbols
+_bigobj_symbol = struct.Struct('<8sIiHBB')
+_archive_member = struct.Struct('<16s12s6s6s8s10s2s')
+_u16 = struct.Struct('<H')
+_u32 = struct.Struct('<I')
+_u32_be = struct.Struct('>I')
+
+_pe32_magic = 0x10b
+_pe32plus_magic = 0x20b
+_archive_magic = b'!<arch>\n'
+_bigobj_class_id = bytes.fromhex('c7a1bad1eebaa94baf20faf66aa4dcb8')
+
+_sym_class_external = 2
+
+# IMAGE_FILE_MACHINE_* values of the targets MSVC compiles for; anything
+# else in the first two bytes means the file is not a COFF object
+_coff_machines = frozenset([
+    0x014c,     # I386
+    0x0166,     # R4000
+    0x01c0,     # ARM
+    0x01c2,     # THUMB
+    0x01c4,     # ARMNT
+    0x0200,     # IA64
+    0x0ebc,     # EBC
+    0x8664,     # AMD64
+    0xa641,     # ARM64EC
+    0xa64e,     # ARM64X
+    0xaa64,     # ARM64
+    ])
+
+def _map(path):
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            raise ValueError('{}: not a PE, COFF or archive file'.format(path))
+
+def _unpack(st, buf, offset):
+    try:
+        return st.unpack_from(buf, offset)
+    except struct.error:
+        raise ValueError('truncated file at offset {}'.format(offset))
+
+def _c_string(buf, offset):
+    end = buf.find(b'\0', offset)
+    if end < 0:
+        raise ValueError('unterminated name at offset {}'.format(offset))
+    return buf[offset:end].decode('utf-8', 'replace')
+
+def _pe_exports(buf):
+    _, pe_offset = _unpack(_dos_header, buf, 0)
+    if buf[pe_offset:pe_offset + 4] != b'PE\0\0':
+        raise ValueError('missing PE signature')
+    header = pe_offset + 4
+    _, section_count, _, _, _, opt_size, _ = _unpack(_file_header, buf, header)
+
+    opt = header + _file_header.size
+    magic, = _unpack(_u16, buf, opt)
+    if magic == _pe32_magic:
+        directories = opt + 96
+    elif magic == _pe32plus_magic:
+        directories = opt + 112
+    else:
+        raise ValueError('unknown optional header magic {:#x}'.format(magic))
+    dir_count, = _unpack(_u32, buf, directories - 4)
+    if dir_count < 1:
+        return
+    export_rva, = _unpack(_u32, buf, directories)
+    if not export_rva:
+        return
+
+    sections = [_unpack(_section_header, buf, opt + opt_size + i * _section_header.size)
+        for i in range(section_count)]
+    def section(rva):
+        # the range of addresses of the section containing rva, and the
+        # difference between the file offsets and addresses within it
+        for _, virtual_size, virtual_address, raw_size, raw_offset in sections:
+            end = virtual_address + max(virtual_size, raw_size)
+            if virtual_address <= rva < end:
+                return virtual_address, end, raw_offset - virtual_address
+        raise ValueError('address {:#x} is outside of all sections'.format(rva))
+    def offset(rva):
+        return rva + section(rva)[2]
+
+    (_, _, _, name_count, _, names_rva, _) = _unpack(_export_directory, buf, offset(export_rva))
+    if not name_count:
+        return
+    names = offset(names_rva)
+    if len(buf) < names + 4 * name_count:
+        raise ValueError('truncated export name table')
+
+    # the names are normally stored together in one section, which is only
+    # looked up again when a name falls outside of it
+    low = high = delta = 0
+    for rva, in _u32.iter_unpack(buf[names:names + 4 * name_count]):
+        if not low <= rva < high:
+            low, high, delta = section(rva)
+        yield _c_string(buf, rva + delta)
+
+def _coff_symbols(buf, symbol_table, symbol_count, symbol):
+    strings = symbol_table + symbol_count * symbol.size
+    i = 0
+    while i < symbol_count:
+        name, _, _, _, storage_class, aux_count = _unpack(symbol, buf, symbol_table + i * symbol.size)
+        if storage_class == _sym_class_external:
+            if name[:4] == b'\0\0\0\0':
+                yield _c_string(buf, strings + _u32.unpack_from(name, 4)[0])
+            else:
+                yield name.rstrip(b'\0').decode('utf-8', 'replace')
+        i += 1 + aux_count
+
+def _is_object(buf):
+    # an import object or /bigobj header, or a COFF file header with a
+    # known machine whose symbol table lies within the file
+    if buf[:4] == b'\0\0\xff\xff':
+        return True
+    if len(buf) < _file_header.size:
+        return False
+    machine, _, _, symbol_table, symbol_count, _, _ = _file_header.unpack_from(buf, 0)
+    return machine in _coff_machines and symbol_table + symbol_count * _symbol.size <= len(buf)
+
+def _object_symbols(buf):
+    if buf[:4] == b'\0\0\xff\xff':
+        header = _unpack(_bigobj_header, buf, 0) if len(buf) >= _bigobj_header.size else None
+        if header is None or header[2] < 2 or header[5] != _bigobj_class_id:
+            # an import object of an import library, which has no symbol table
+            return iter(())
+        return _coff_symbols(buf, header[-2], header[-1], _bigobj_symbol)
+
+    _, _, _, symbol_table, symbol_count, _, _ = _unpack(_file_header, buf, 0)
+    return _coff_symbols(buf, symbol_table, symbol_count, _symbol)
+
+def _archive_symbols(buf):
+    # the first linker member lists every public symbol of the archive:
+    # a big-endian count and member offsets, then the names
+    pos = len(_archive_magic)
+    name, _, _, _, _, size, _ = _unpack(_archive_member, buf, pos)
+    if name.rstrip() != b'/':
+        raise ValueError('archive has no linker member')
+    data = pos + _archive_member.size
+    count, = _unpack(_u32_be, buf, data)
+    pos = data + 4 + 4 * count
+    end = data + int(size)
+    for _ in range(count):
+        name_end = buf.find(b'\0', pos, end)
+        if name_end < 0:
+            raise ValueError('truncated linker member')
+        yield buf[pos:name_end].decode('utf-8', 'replace')
+        pos = name_end + 1
+
+def _symbol_names(path):
+    buf = _map(path)
+    try:
+        if buf[:2] == b'MZ':
+            names = _pe_exports(buf)
+        elif buf[:len(_archive_magic)] == _archive_magic:
+            names = _archive_symbols(buf)
+        elif _is_object(buf):
+            names = _object_symbols(buf)
+        else:
+            raise ValueError('{}: not a PE, COFF or archive file'.format(path))
+        for name in names:
+            yield name
+    finally:
+        buf.close()
+
+def symbol_names(path):
+    # the exported names of a PE image, the external symbols of a COFF
+    # object or the public symbols of an archive, depending on the file
+    return _symbol_names(path)
+
+def demangle_binary(path, errors='return'):
+    return demangle_many(symbol_names(path), errors)
@@ -0,0 +1,105 @@
+import re
+import speg
+from .msvc import _Demangler
+from .cdecl import _Renderer
+
+# Finds mangled names in free text and replaces them with their C++
+# declarations, leaving the rest of the text untouched.
+#
+# Candidates are runs of the characters mangled names are made of that
+# start with '?' and contain an '@'. The pattern starts with a literal,
+# which lets the regex engine skip to the next '?' in C, so text without
+# symbols is scanned at the speed of a string search. A candidate that
+# fails to demangle, or is longer than any name MSVC writes (longer names
+# are replaced by a hash), is left as it is. The declarations of recently
+# seen names are cached, as logs tend to repeat the same symbols.
+
+_candidate_re = re.compile(r'\?[\w?$<>]*@[\w@?$<>]*')
+_max_name_length = 4096
+
+class _Scanner(object):
+    def __init__(self, cache_size=4096):
+        self.cache_size = cache_size
+        self._demangler = _Demangler()
+        self._render = _Renderer().sym
+        self._cache = {}
+
+    def text(self, text):
+        if '?' not in text:
+            return text
+        return _candidate_re.sub(self._replace, text)
+
+    def _replace(self, m):
+        name = m.group()
+        if len(name) > _max_name_length:
+            return name
+        r = self._cache.get(name)
+        if r is None:
+            try:
+                r = self._render(self._demangler.demangle(name))
+            except speg.ParseError:
+                r = name
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[name] = r
+        return r
+
+def demangle_text(text):
+    return _Scanner().text(text)
+
+# A candidate spans a whole run of name characters from its first '?'.
+_name_chars = r'\w?$<>@'
+_run_start_re = re.compile(r'[^{0}][{0}]*\Z'.format(_name_chars))
+_run_end_re = re.compile(r'[{}]*'.format(_name_chars))
+
+def _cut(chunk):
+    # the end of the longest prefix of chunk that can be scanned on its
+    # own: one that ends outside a run of name characters, or, if chunk
+    # is a single run, before the first '?' that may start a name in it
+    cut = chunk.rfind('\n') + 1 or chunk.rfind(' ') + 1
+    if cut:
+        return cut
+    # the last run is searched for in growing windows at the end, as the
+    # regex engine can only search forwards
+    window = 256
+    start = len(chunk)
+    while start:
+        start = max(start - window, 0)
+        m = _run_start_re.search(chunk, start)
+        if m is not None:
+            return m.start() + 1
+        window *= 2
+    cut = chunk.find('?')
+    return cut if cut >= 0 else len(chunk)
+
+def _demangle_stream(chunks, cache_size):
+    # Each chunk is cut by _cut, so that no name is split between two
+    # processed pieces; the rest is prepended to the next chunk. A rest
+    # longer than any name is copied through, together with the remainder
+    # of its run, so that memory use stays bounded on input with long runs
+    # of name characters.
+    scanner = _Scanner(cache_size)
+    pending = ''
+    skip = False
+    for chunk in chunks:
+        if skip:
+            end = _run_end_re.match(chunk).end()
+            skip = end == len(chunk)
+            if end:
+                yield chunk[:end]
+                chunk = chunk[end:]
+        if pending:
+            chunk = pending + chunk
+        cut = _cut(chunk)
+        pending = chunk[cut:]
+        if cut:
+            yield scanner.text(chunk[:cut])
+        if len(pending) > _max_name_length:
+            yield pending
+            pending = ''
+            skip = True
+    if pending:
+        yield scanner.text(pending)
+
+def demangle_stream(chunks, cache_size=4096):
+    return _demangle_stream(chunks, cache_size)
@@ -0,0 +1,380 @@
+import gc
+import re
+from .ast import *
+from .msvc import _special_names_map, _special_names_rtti_map
+
+# A compact binary form of demangled symbols, which decodes without
+# parsing.
+#
+# A message holds a string table and a table of composite nodes. While
+# decoding, every node is stored in a list of the composite nodes, then
+# the strings, then a fixed set of shared constants (all SimpleTypes,
+# None and the special names); fields refer to other nodes by their index
+# in that list, so the most referenced ones have the smallest indexes.
+# Composite nodes are written in post-order, so a node only refers to
+# nodes before it. Structurally equal nodes, within a symbol or
+# across the symbols of a batch, are written once, and the decoded symbols
+# share them as if they had gone through an Interner. Decoded SimpleTypes
+# and special names are shared between all decoded symbols too.
+#
+# Every field is an unsigned integer, stored as a varint (LEB128: seven
+# bits per byte, least significant first, the high bit set on all but the
+# last byte). Most fields of single symbols take one byte, and runs of
+# one-byte fields are read by C-level calls.
+#
+# Layout: version byte, varint header (strings length, node count, root
+# count), string table (UTF-8, NUL-terminated), fields.
+
+_version = 2
+
+_basic_types = (
+    t_none, t_void, t_bool, t_char, t_schar, t_uchar, t_sshort, t_ushort,
+    t_sint, t_uint, t_slong, t_ulong, t_slonglong, t_ulonglong, t_wchar,
+    t_float, t_double, t_longdouble, t_ellipsis,
+    )
+_cconvs = (cconv_cdecl, cconv_stdcall, cconv_thiscall, cconv_fastcall)
+_fn_kinds = (fn_free, fn_instance, fn_virtual, fn_class_static)
+_access_specs = (None, access_private, access_protected, access_public)
+_addr_spaces = (None, as_default, as_msvc_x64_absolute)
+_operators = ('*', '&', '&&')
+
+# The special names encoded as constants, by their mangled code. Their
+# positions are part of the format, so this list is fixed rather than
+# taken from the demangler's tables. Special names added to those tables
+# later are written as _t_special_code nodes holding their code.
+_special_name_codes = (
+    '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
+    'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M',
+    'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z',
+    '_0', '_1', '_2', '_3', '_4', '_5', '_6', '_7', '_8', '_9',
+    '_A', '_B', '_D', '_E', '_F', '_G', '_H', '_I', '_J', '_K', '_L',
+    '_M', '_N', '_O', '_P', '_S', '_T', '_U', '_V', '_W', '_X', '_Y',
+    '__A', '__B', '__C', '__D', '__E', '__F', '__G', '__H', '__I', '__J', '__K',
+    '_R0', '_R1', '_R2', '_R3', '_R4',
+    )
+_special_names_by_code = dict(_special_names_map)
+_special_names_by_code.update(('_R' + code, name) for code, name in _special_names_rtti_map.items())
+_special_names = tuple(_special_names_by_code[code] for code in _special_name_codes)
+
+_simple_types = tuple(SimpleType(cv, basic_type) for cv in range(4) for basic_type in _basic_types)
+_constants = _simple_types + (None,) + _special_names
+_none_index = len(_simple_types)
+
+def _inverse(values):
+    return dict((value, i) for i, value in enumerate(values))
+
+_cconvs_inv = _inverse(_cconvs)
+_fn_kinds_inv = _inverse(_fn_kinds)
+_access_specs_inv = _inverse(_access_specs)
+_addr_spaces_inv = _inverse(_addr_spaces)
+_operators_inv = _inverse(_operators)
+
+# special names are looked up by identity, as distinct special names
+# may compare equal (operator* is both dereference and multiplication)
+_special_names_inv = dict((id(name), _none_index + 1 + i) for i, name in enumerate(_special_names))
+_special_codes_inv = dict((id(name), code) for code, name in _special_names_by_code.items())
+_simple_types_inv = dict(((t.cv, t.basic_type), i) for i, t in enumerate(_simple_types))
+
+# node tags
+_t_qname = 0
+_t_ptr = 1
+_t_class = 2
+_t_function_type = 3
+_t_template = 4
+_t_array = 5
+_t_int = 6
+_t_function = 7
+_t_variable = 8
+_t_special = 9
+_t_rtti = 10
+_t_rtti_type_descriptor = 11
+_t_rtti_base_class_descriptor = 12
+_t_special_code = 13
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+def _write_varints(values):
+    out = bytearray()
+    for n in values:
+        while n >= 0x80:
+            out.append(n & 0x7f | 0x80)
+            n >>= 7
+        out.append(n)
+    return out
+
+_multibyte_re = re.compile(b'[\x80-\xff]+[\x00-\x7f]')
+_varint_re = re.compile(b'[\x80-\xff]*[\x00-\x7f]')
+
+def _varint_value(b):
+    n = 0
+    for shift, byte in enumerate(b):
+        n |= (byte & 0x7f) << 7 * shift
+    return n
+
+def _read_varints(data):
+    # Single-byte fields are copied in runs by C-level calls; only the
+    # multi-byte ones, which separate the runs, are decoded in Python.
+    if data and data[-1] & 0x80:
+        raise ValueError('truncated varint')
+    groups = _multibyte_re.findall(data)
+    if not groups:
+        return list(data)
+    runs = _multibyte_re.split(data)
+    f = []
+    extend = f.extend
+    append = f.append
+    for run, b in zip(runs, groups):
+        extend(run)
+        if len(b) == 2:
+            append(b[0] & 0x7f | b[1] << 7)
+        elif len(b) == 3:
+            append(b[0] & 0x7f | (b[1] & 0x7f) << 7 | b[2] << 14)
+        else:
+            append(_varint_value(b))
+    extend(runs[-1])
+    return f
+
+def _read_varint(data, pos):
+    if pos < len(data) and data[pos] < 0x80:
+        return data[pos], pos + 1
+    m = _varint_re.match(data, pos)
+    if m is None:
+        raise ValueError('truncated header')
+    return _varint_value(m.group()), m.end()
+
+# added to constant indexes until they are resolved, above any other field
+_constant_ref = 1 << 62
+
+def _opt(value):
+    # optional small integers are stored shifted by one, 0 is None
+    return 0 if value is None else value + 1
+
+class _Encoder(object):
+    # The indexes of strings and constants depend on the number of
+    # composite nodes, which precede them, so references to them are
+    # collected as negative numbers (-1 for the first string) and as
+    # constant indexes offset by _constant_ref, and resolved at the end.
+    # References to composite nodes are final. Nodes are shared by
+    # their record, whose references are exact, where comparing the nodes
+    # would e.g. let a plain name stand for an equal-looking SpecialName;
+    # the records of objects already seen are looked up by identity.
+
+    def __init__(self):
+        self._fields = []
+        self._nodes = {}
+        self._records = {}
+        self._strings = {}
+
+        # keeps the encoded objects alive, so that their ids stay unique
+        self._objs = []
+
+    def encode(self, objs):
+        roots = [self._ref(obj) for obj in objs]
+        strings_base = len(self._records) - 1
+        constants_base = len(self._records) + len(self._strings) - _constant_ref
+        fields = [
+            f if 0 <= f < _constant_ref else strings_base - f if f < 0 else constants_base + f
+            for f in self._fields + roots]
+
+        strings = ''.join(s + '\0' for s in self._strings).encode('utf-8')
+        return b''.join((
+            bytes((_version,)),
+            _write_varints((len(strings), len(self._records), len(roots))),
+            strings,
+            _write_varints(fields),
+            ))
+
+    def _ref(self, obj):
+        if isinstance(obj, str):
+            i = self._strings.get(obj)
+            if i is None:
+                i = self._strings[obj] = -1 - len(self._strings)
+            return i
+        if obj is None:
+            return _constant_ref + _none_index
+        if isinstance(obj, SimpleType):
+            return _constant_ref + _simple_types_inv[obj.cv, obj.basic_type]
+        i = _special_names_inv.get(id(obj))
+        if i is not None:
+            return _constant_ref + i
+
+        i = self._nodes.get(id(obj))
+        if i is not None:
+            return i
+
+        record = self._record(obj)
+        i = self._records.get(record)
+        if i is None:
+            self._fields.extend(record)
+            i = self._records[record] = len(self._records)
+        self._nodes[id(obj)] = i
+        self._objs.append(obj)
+        return i
+
+    def _record(self, obj):
+        ref = self._ref
+        if isinstance(obj, tuple):
+            return (_t_qname, len(obj)) + tuple(ref(name) for name in obj)
+        if isinstance(obj, PtrType):
+            return (_t_ptr, obj.cv, ref(obj.target), _operators_inv[obj.operator], _addr_spaces_inv[obj.addr_space])
+        if isinstance(obj, ClassType):
+            return (_t_class, obj.cv, obj.kind, ref(obj.qname), _addr_spaces_inv[obj.addr_space])
+        if isinstance(obj, FunctionType):
+            params = tuple(ref(param) for param in obj.params)
+            return (_t_function_type, _cconvs_inv[obj.cconv], ref(obj.ret_type), _opt(obj.this_cv), len(params)) + params
+        if isinstance(obj, TemplateId):
+            args = tuple(ref(arg) for arg in obj.args)
+            return (_t_template, ref(obj.name), len(args)) + args
+        if isinstance(obj, int):
+            return (_t_int, ref(str(obj)))
+        if isinstance(obj, ArrayType):
+            return (_t_array, obj.cv, ref(obj.target), len(obj.dims)) + tuple(_zigzag(dim) for dim in obj.dims)
+        if isinstance(obj, Function):
+            return (_t_function, ref(obj.qname), ref(obj.type),
+                _fn_kinds_inv[obj.kind], _access_specs_inv[obj.access_spec], _addr_spaces_inv[obj.addr_space])
+        if isinstance(obj, Variable):
+            return (_t_variable, ref(obj.qname), ref(obj.ret_type), _opt(obj.cv),
+                ord(obj.storage_class), _addr_spaces_inv[obj.addr_space])
+        if isinstance(obj, RTTITypeDescriptorName):
+            return (_t_rtti_type_descriptor, ref(obj.desc), ref(obj.type))
+        if isinstance(obj, RTTIBaseClassDescriptorName):
+            return (_t_rtti_base_class_descriptor, ref(obj.desc),
+                _zigzag(obj.member_displacement), _zigzag(obj.vftable_displacement),
+                _zigzag(obj.displacement_within_vftable), _zigzag(obj.attributes))
+        code = _special_codes_inv.get(id(obj))
+        if code is not None:
+            return (_t_special_code, ref(code))
+        if isinstance(obj, RTTIName):
+            return (_t_rtti, ref(obj.desc), obj.rtti_type)
+        if isinstance(obj, SpecialName):
+            return (_t_special, ref(obj.desc))
+        raise TypeError('cannot serialize {!r}'.format(obj))
+
+def _decode(data):
+    if not data or data[0] != _version:
+        raise ValueError('unsupported serialization version {}'.format(data[0] if data else None))
+
+    strings_len, pos = _read_varint(data, 1)
+    count, pos = _read_varint(data, pos)
+    root_count, pos = _read_varint(data, pos)
+    nodes = [None] * count
+    if strings_len:
+        nodes.extend(str(data[pos:pos + strings_len - 1], 'utf-8').split('\0'))
+    nodes.extend(_constants)
+    pos += strings_len
+
+    f = _read_varints(data[pos:])
+
+    # The most common nodes are created without calling their
+    # constructors, which saves two Python calls per node; this has to
+    # be kept in sync with the slots of the classes.
+    new = object.__new__
+    node = nodes.__getitem__
+    i = 0
+    for k in range(count):
+        tag = f[i]
+        if tag == _t_qname:
+            n = f[i + 1]
+            nodes[k] = tuple(map(node, f[i + 2:i + 2 + n]))
+            i += 2 + n
+        elif tag == _t_ptr:
+            obj = new(PtrType)
+            obj.cv = f[i + 1]
+            obj.target = nodes[f[i + 2]]
+            obj.operator = _operators[f[i + 3]]
+            obj.addr_space = _addr_spaces[f[i + 4]]
+            nodes[k] = obj
+            i += 5
+        elif tag == _t_class:
+            obj = new(ClassType)
+            obj.cv = f[i + 1]
+            obj.kind = f[i + 2]
+            obj.qname = nodes[f[i + 3]]
+            obj.addr_space = _addr_spaces[f[i + 4]]
+            nodes[k] = obj
+            i += 5
+        elif tag == _t_function_type:
+            this_cv = f[i + 3]
+            n = f[i + 4]
+            obj = new(FunctionType)
+            obj.cv = cv_none
+            obj.cconv = _cconvs[f[i + 1]]
+            obj.ret_type = nodes[f[i + 2]]
+            obj.params = tuple(map(node, f[i + 5:i + 5 + n]))
+            obj.this_cv = None if this_cv == 0 else this_cv - 1
+            nodes[k] = obj
+            i += 5 + n
+        elif tag == _t_function:
+            obj = new(Function)
+            obj.qname = nodes[f[i + 1]]
+            obj.type = nodes[f[i + 2]]
+            obj.kind = _fn_kinds[f[i + 3]]
+            obj.access_spec = _access_specs[f[i + 4]]
+            obj.addr_space = _addr_spaces[f[i + 5]]
+            nodes[k] = obj
+            i += 6
+        elif tag == _t_template:
+            n = f[i + 2]
+            nodes[k] = TemplateId(nodes[f[i + 1]], tuple(map(node, f[i + 3:i + 3 + n])))
+            i += 3 + n
+        elif tag == _t_int:
+            nodes[k] = int(nodes[f[i + 1]])
+            i += 2
+        elif tag == _t_array:
+            n = f[i + 3]
+            dims = tuple([_unzigzag(dim) for dim in f[i + 4:i + 4 + n]])
+            nodes[k] = ArrayType(dims, nodes[f[i + 2]], f[i + 1])
+            i += 4 + n
+        elif tag == _t_variable:
+            cv = f[i + 3]
+            nodes[k] = Variable(nodes[f[i + 1]], nodes[f[i + 2]], None if cv == 0 else cv - 1, chr(f[i + 4]), _addr_spaces[f[i + 5]])
+            i += 6
+        elif tag == _t_special:
+            nodes[k] = SpecialName(nodes[f[i + 1]])
+            i += 2
+        elif tag == _t_rtti:
+            nodes[k] = RTTIName(nodes[f[i + 1]], f[i + 2])
+            i += 3
+        elif tag == _t_rtti_type_descriptor:
+            nodes[k] = RTTITypeDescriptorName(nodes[f[i + 1]], nodes[f[i + 2]])
+            i += 3
+        elif tag == _t_rtti_base_class_descriptor:
+            nodes[k] = RTTIBaseClassDescriptorName(nodes[f[i + 1]], *[_unzigzag(n) for n in f[i + 2:i + 6]])
+            i += 6
+        elif tag == _t_special_code:
+            code = nodes[f[i + 1]]
+            if code not in _special_names_by_code:
+                raise ValueError('unknown special name code {!r}'.format(code))
+            nodes[k] = _special_names_by_code[code]
+            i += 2
+        else:
+            raise ValueError('invalid node tag {}'.format(tag))
+
+    return list(map(node, f[i:i + root_count]))
+
+def dumps(obj):
+    return _Encoder().encode((obj,))
+
+def loads(data):
+    return _decode(data)[0]
+
+def dumps_many(objs):
+    # Encodes a batch of symbols into one message; strings and nodes
+    # equal between them are written once.
+    return _Encoder().encode(objs)
+
+def loads_many(data):
+    # A large batch creates enough objects to trigger several collections
+    # of the cyclic garbage collector, each walking all nodes decoded so
+    # far; decoded trees hold no cycles, so it is paused meanwhile.
+    if not gc.isenabled():
+        return _decode(data)
+    gc.disable()
+    try:
+        return _decode(data)
+    finally:
+        gc.enable()
@@ -0,0 +1,155 @@
+import collections
+import time
+import types
+import speg
+from .msvc import _Demangler, _demangle_many, _check_errors
+
+# Opt-in instrumentation of the demangler.
+#
+# DemangleStats demangles through a subclass of _Demangler whose parsing
+# methods (the productions of the grammar) are wrapped to count calls,
+# failures and time. The production demangler is left untouched, so the
+# instrumentation costs nothing unless a DemangleStats is used.
+#
+# Time is measured per call with time.perf_counter(). The own time of a
+# production excludes the productions it called; its total time includes
+# them, and counts recursive calls (types within types) once per level.
+# The wrappers themselves take time, which shows up as own time of the
+# calling production; relative figures are meaningful, absolute ones are
+# inflated. The single-pass demangler never backtracks, so a failure is
+# a production that raised a ParseError, which aborts the whole symbol,
+# or an IndexError, which is how every production runs into the end of
+# truncated input before _parse turns it into a DemangleError.
+
+_productions = (
+    '_root', '_root_symbol', '_root_function', '_root_variable',
+    '_fn_symbol_type', '_qname', '_name', '_simple_name', '_rtti_name',
+    '_int', '_modifier', '_type', '_class_type', '_array_type',
+    '_ptr_type', '_fn_type', '_fn_signature',
+    )
+
+class ProductionStats(object):
+    __slots__ = ('calls', 'failures', 'own_time', 'total_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.own_time = 0.0
+        self.total_time = 0.0
+
+    def __repr__(self):
+        return 'ProductionStats(calls={}, failures={}, own_time={:.6f}, total_time={:.6f})'.format(
+            self.calls, self.failures, self.own_time, self.total_time)
+
+def _instrument(fn, name):
+    def wrapper(self, *args):
+        entry = self._entries[name]
+        self._depth += 1
+        if self._depth > self._max_depth:
+            self._max_depth = self._depth
+        children = self._children
+        self._children = 0.0
+        start = time.perf_counter()
+        try:
+            return fn(self, *args)
+        except (speg.ParseError, IndexError):
+            entry.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            entry.calls += 1
+            entry.total_time += elapsed
+            entry.own_time += elapsed - self._children
+            self._children = children + elapsed
+            self._depth -= 1
+    wrapper.__name__ = name
+    return wrapper
+
+class _InstrumentedDemangler(_Demangler):
+    def __init__(self, stats):
+        super().__init__()
+        self._stats = stats
+        self._entries = stats.productions
+        self._depth = 0
+        self._max_depth = 0
+        self._children = 0.0
+
+    def _parse(self, s, production, *args):
+        self._depth = 0
+        self._max_depth = 0
+        self._children = 0.0
+        start = time.perf_counter()
+        error = None
+        try:
+            return super()._parse(s, production, *args)
+        except speg.ParseError as e:
+            error = e
+            raise
+        finally:
+            self._stats._record(s, time.perf_counter() - start, self._max_depth, error)
+
+for _name in _productions:
+    setattr(_InstrumentedDemangler, _name, _instrument(getattr(_Demangler, _name), _name))
+
+# compound types are dispatched through this table rather than by name
+_InstrumentedDemangler._type_dispatch = dict(
+    (code, getattr(_InstrumentedDemangler, entry.__name__) if isinstance(entry, types.FunctionType) else entry)
+    for code, entry in _Demangler._type_dispatch.items())
+
+class DemangleStats(object):
+    # Collects statistics of the symbols demangled through it:
+    #
+    #  * productions: the name of each parsing method of the demangler
+    #    mapped to its ProductionStats,
+    #  * lengths: a Counter of symbol lengths, rounded down to a multiple
+    #    of length_bucket,
+    #  * depths: a Counter of the maximum nesting depth of productions
+    #    reached by each symbol,
+    #  * symbols, failures and time: totals over all symbols.
+    #
+    # If given, callback(name, seconds, depth, error) is called after each
+    # symbol; error is the ParseError or None. A DemangleStats must not be
+    # used from several threads at once.
+
+    def __init__(self, length_bucket=16, callback=None):
+        self.length_bucket = length_bucket
+        self.callback = callback
+        self.clear()
+
+    def clear(self):
+        self.productions = collections.defaultdict(ProductionStats)
+        self.lengths = collections.Counter()
+        self.depths = collections.Counter()
+        self.symbols = 0
+        self.failures = 0
+        self.time = 0.0
+        self._demangler = _InstrumentedDemangler(self)
+
+    def demangle(self, name):
+        return self._demangler.demangle(name)
+
+    def demangle_qname(self, name):
+        return self._demangler.demangle_qname(name)
+
+    def demangle_many(self, names, errors='return', interner=None):
+        _check_errors(errors)
+        return _demangle_many(self._demangler, names, errors, interner)
+
+    def _record(self, name, elapsed, depth, error):
+        self.symbols += 1
+        if error is not None:
+            self.failures += 1
+        self.time += elapsed
+        self.lengths[len(name) // self.length_bucket * self.length_bucket] += 1
+        self.depths[depth] += 1
+        if self.callback is not None:
+            self.callback(name, elapsed, depth, error)
+
+    def report(self):
+        # a table of the productions by own time, followed by totals
+        lines = ['{:16} {:>10} {:>9} {:>10} {:>10}'.format('production', 'calls', 'failures', 'own ms', 'total ms')]
+        for name, entry in sorted(self.productions.items(), key=lambda item: -item[1].own_time):
+            lines.append('{:16} {:10} {:9} {:10.1f} {:10.1f}'.format(
+                name, entry.calls, entry.failures, entry.own_time * 1000, entry.total_time * 1000))
+        lines.append('{} symbols, {} failures, {:.1f} ms'.format(self.symbols, self.failures, self.time * 1000))
+        return '\n'.join(lines)